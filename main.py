@@ -20,6 +20,7 @@ from src.handlers.help_handler import HelpHandler
 from src.handlers.user_handlers import UserHandler
 from src.utils.formatting import escape_markdown
 from src.utils.panel_api import PanelAPI
+from src.utils.rate_limiter import TokenBucketLimiter
 from src.utils.logger import CustomLogger
 from src.utils.exceptions import *
 from proj import *
@@ -80,6 +81,7 @@ class XUIBot:
             # Initialize bot with parse_mode and exception handler
             self.bot = telebot.TeleBot(self.bot_token, parse_mode='MarkdownV2')
             self.bot.exception_handler = self._handle_telegram_exceptions
+            self.rate_limiter = TokenBucketLimiter(RATE_LIMIT_MESSAGES, RATE_LIMIT_WINDOW)
             
             # Test the token by getting bot info
             bot_info = self.bot.get_me()
@@ -192,12 +194,22 @@ class XUIBot:
                     # Log user data
                     self.db.log_event('INFO', 'user_data', user_id, f"User data received: {username}")
                     
+                    # Split a command into its name and arguments once
+                    is_command = bool(message.text and message.text.startswith('/'))
+                    if is_command:
+                        # split() so tabs/newlines end the command too, and the
+                        # arguments come back whitespace-normalised
+                        command, *args = message.text.split()
+                        command_args = ' '.join(args)
+                    else:
+                        command = command_args = None
+                    
                     # Log message details
                     message_info = {
                         'message_id': message.message_id,
                         'chat_id': message.chat.id,
                         'message_type': message.content_type,
-                        'command': message.text.split()[0] if message.text and message.text.startswith('/') else None
+                        'command': command
                     }
                     
                     # Log chat message
@@ -209,9 +221,9 @@ class XUIBot:
                         content=message.text or message.caption or '',
                         reply_to_message_id=message.reply_to_message.message_id if message.reply_to_message else None,
                         forward_from_id=message.forward_from.id if message.forward_from else None,
-                        is_command=bool(message.text and message.text.startswith('/')),
-                        command_name=message.text.split()[0][1:] if message.text and message.text.startswith('/') else None,
-                        command_args=' '.join(message.text.split()[1:]) if message.text and message.text.startswith('/') else None
+                        is_command=is_command,
+                        command_name=command[1:] if is_command else None,
+                        command_args=command_args
                     )
                     
                     # Log user activity
@@ -373,9 +385,7 @@ class XUIBot:
     def _check_rate_limit(self, user_id: int) -> bool:
         """Check if user has exceeded rate limit"""
         try:
-            current_time = time.time()
-            user_messages = self.db.get_user_messages(user_id, current_time - RATE_LIMIT_WINDOW)
-            return len(user_messages) < RATE_LIMIT_MESSAGES
+            return self.rate_limiter.allow(user_id)
         except Exception as e:
             logger.error(f"Error checking rate limit: {str(e)}")
             return True  # Allow message in case of error
@@ -1,11 +1,21 @@
 import os
 import requests
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator, Tuple, Callable
 from datetime import datetime, timedelta, timezone
 from proj import *
-import pytz
+import atexit
+import functools
+import gzip
 import json
 import logging
+import logging.handlers
+import queue
+import threading
+
+import ijson
+import orjson
+import redis
+from requests.adapters import HTTPAdapter
 
 from src.utils.logger import CustomLogger
 from src.utils.formatting import format_date, format_remaining_time
@@ -13,21 +23,73 @@ from src.utils.formatting import format_date, format_remaining_time
 # Initialize logger
 logger = CustomLogger("XUIClient")
 
-# Add a dedicated logger for date debugging
-date_debug_logger = logging.getLogger("DateDebug")
-date_debug_logger.setLevel(logging.DEBUG)
-date_debug_handler = logging.FileHandler("date_debug.log", encoding="utf-8")
-date_debug_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-date_debug_logger.addHandler(date_debug_handler)
+@functools.cache
+def _get_date_debug_logger() -> logging.Logger:
+    """Create the dedicated date debugging logger on first use.
+
+    date_debug.log is written by a QueueListener thread so the request
+    thread never blocks on disk writes.
+    """
+    date_debug_logger = logging.getLogger("DateDebug")
+    date_debug_logger.setLevel(logging.DEBUG)
+    date_debug_handler = logging.FileHandler("date_debug.log", encoding="utf-8")
+    date_debug_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, date_debug_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    date_debug_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    return date_debug_logger
+
+# Inbound list responses at or above this size (bytes) are parsed incrementally
+STREAM_THRESHOLD = 1024 * 1024
+
+# JSON request bodies at or above this size (bytes) are sent gzip-compressed
+# when XUI_GZIP_REQUESTS=1. Off by default: the stock X-UI panel (gin) binds
+# the raw body and doesn't decode Content-Encoding: gzip, so only enable it
+# behind a proxy or panel build that does.
+GZIP_REQUESTS = os.getenv('XUI_GZIP_REQUESTS', '0') == '1'
+GZIP_THRESHOLD = 2 * 1024
+
+# Optional Redis for sharing per-user client lists between processes
+REDIS_URL = os.getenv('REDIS_URL')
+CLIENTS_CACHE_TTL = 30  # seconds
+
+# Shared instance handed out by get_client()
+_client: Optional["XUIClient"] = None
+_client_lock = threading.Lock()
 
 class XUIClient:
-    def __init__(self):
-        # Hardcoded configuration
-        self.base_url = PANEL_URL  # Replace with your X-UI panel URL
-        self.username = PANEL_USERNAME  # Replace with your X-UI username
-        self.password = PANEL_PASSWORD  # Replace with your X-UI password
+    """Client for the X-UI panel API.
+
+    Use get_client() instead of constructing this directly so that every
+    caller shares one session, its pooled connections and TLS session state.
+    """
+
+    _BACKUP_MESSAGES = (
+        'Backup created successfully using new endpoint',
+        'Backup created successfully using legacy endpoint',
+        'Backup created from inbounds list',
+    )
+
+    def __init__(self, base_url: Optional[str] = None, username: Optional[str] = None,
+                 password: Optional[str] = None, stream_threshold: int = STREAM_THRESHOLD):
+        # Fall back to the panel settings from proj
+        self.base_url = base_url or PANEL_URL
+        self.username = username or PANEL_USERNAME
+        self.password = password or PANEL_PASSWORD
+        self.stream_threshold = stream_threshold
         self.session = requests.Session()
-        self._login()
+        # Every request goes to the same panel host, so keep one pool of
+        # reusable connections whose TLS state persists between calls
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Operation name -> index of the endpoint variant this panel answered on
+        self._endpoint_cache: Dict[str, int] = {}
+        # Login is deferred until the first API call (see _send)
+        self._authenticated = False
+        self._redis = redis.Redis.from_url(REDIS_URL) if REDIS_URL else None
 
     def _login(self) -> bool:
         """Login to X-UI panel."""
@@ -36,11 +98,39 @@ class XUIClient:
             'password': self.password
         }
         response = self.session.post(f'{self.base_url}/login', json=login_payload)
-        return response.status_code == 200
+        self._authenticated = response.status_code == 200
+        return self._authenticated
+
+    def _send(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """Send an authenticated request, logging in first if needed.
+
+        A 401 response marks the session as logged out; the login is redone
+        and the request retried once.
+        """
+        if not self._authenticated:
+            self._login()
+        url = f'{self.base_url}{endpoint}'
+        response = self.session.request(method, url, **kwargs)
+        if response.status_code == 401:
+            response.close()
+            self._authenticated = False
+            if self._login():
+                response = self.session.request(method, url, **kwargs)
+        return response
+
+    @staticmethod
+    def _json_body(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Build request kwargs for a compact JSON body, gzipping large ones if enabled."""
+        body = orjson.dumps(payload)
+        headers = {'Content-Type': 'application/json'}
+        if GZIP_REQUESTS and len(body) >= GZIP_THRESHOLD:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        return {'data': body, 'headers': headers}
 
     def get_client_traffics(self, email: str) -> Optional[Dict[str, Any]]:
         """Get client traffic information."""
-        response = self.session.get(f'{self.base_url}/panel/api/inbounds/getClientTraffics/{email}')
+        response = self._send('GET', f'/panel/api/inbounds/getClientTraffics/{email}')
         if response.status_code == 200:
             return response.json()
         return None
@@ -52,43 +142,31 @@ class XUIClient:
             Dict containing backup data and status information
         """
         try:
-            # Try new createbackup endpoint first
-            response = self.session.get(f'{self.base_url}/panel/api/inbounds/createbackup')
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    return {
-                        'success': True,
-                        'data': data.get('obj', {}),
-                        'message': 'Backup created successfully using new endpoint'
-                    }
-            
-            # Fallback to legacy backup endpoint
-            response = self.session.post(f'{self.base_url}/panel/api/inbounds/backup')
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    return {
-                        'success': True,
-                        'data': data.get('obj', {}),
-                        'message': 'Backup created successfully using legacy endpoint'
-                    }
-            
-            # Final fallback to list endpoint
-            response = self.session.get(f'{self.base_url}/panel/api/inbounds/list')
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    return {
-                        'success': True,
-                        'data': data.get('obj', {}),
-                        'message': 'Backup created from inbounds list'
-                    }
+            response, index = self._call_with_fallback(
+                'create_backup',
+                [
+                    ('GET', '/panel/api/inbounds/createbackup'),  # New createbackup endpoint
+                    ('POST', '/panel/api/inbounds/backup'),  # Legacy backup endpoint
+                ],
+                accept=self._accept_success
+            )
+            if index is None:
+                # Last resort only: the list is not a backup, so it is never
+                # remembered in place of the real endpoints
+                response = self._send('GET', '/panel/api/inbounds/list')
+                if self._accept_success(response):
+                    index = len(self._BACKUP_MESSAGES) - 1
+            if index is not None:
+                return {
+                    'success': True,
+                    'data': response.json().get('obj', {}),
+                    'message': self._BACKUP_MESSAGES[index]
+                }
                     
             return {
                 'success': False,
                 'error': 'Failed to create backup using any available endpoint',
-                'status_code': response.status_code
+                'status_code': response.status_code if response is not None else None
             }
             
         except requests.exceptions.RequestException as e:
@@ -106,7 +184,7 @@ class XUIClient:
 
     def get_client_ips(self, email: str) -> Optional[Dict[str, Any]]:
         """Get IP addresses used by a client."""
-        response = self.session.post(f'{self.base_url}/panel/api/inbounds/clientIps/{email}')
+        response = self._send('POST', f'/panel/api/inbounds/clientIps/{email}')
         if response.status_code == 200:
             return response.json()
         return None
@@ -135,7 +213,7 @@ class XUIClient:
             "settings": str(settings)
         }
         
-        response = self.session.post(f'{self.base_url}/panel/api/inbounds/addClient', json=payload)
+        response = self._send('POST', '/panel/api/inbounds/addClient', **self._json_body(payload))
         if response.status_code == 200:
             return response.json()
         return None
@@ -164,7 +242,7 @@ class XUIClient:
             "settings": str(settings)
         }
         
-        response = self.session.post(f'{self.base_url}/panel/api/inbounds/updateClient/{uuid}', json=payload)
+        response = self._send('POST', f'/panel/api/inbounds/updateClient/{uuid}', **self._json_body(payload))
         if response.status_code == 200:
             return response.json()
         return None
@@ -172,7 +250,7 @@ class XUIClient:
     def reset_client_traffic(self, inbound_id: int, email: str) -> bool:
         """Reset traffic statistics for a client."""
         try:
-            response = self.session.post(f'{self.base_url}/panel/api/inbounds/{inbound_id}/resetClientTraffic/{email}')
+            response = self._send('POST', f'/panel/api/inbounds/{inbound_id}/resetClientTraffic/{email}')
             if response.status_code == 200:
                 return True
             else:
@@ -184,7 +262,7 @@ class XUIClient:
 
     def get_online_clients(self) -> Optional[List[Dict[str, Any]]]:
         """Get list of currently online clients."""
-        response = self.session.post(f'{self.base_url}/panel/api/inbounds/onlines')
+        response = self._send('POST', '/panel/api/inbounds/onlines')
         if response.status_code == 200:
             data = response.json()
             if isinstance(data, dict) and 'obj' in data:
@@ -204,26 +282,130 @@ class XUIClient:
 
     def _make_request(self, method: str, endpoint: str, **kwargs) -> dict:
         """Make an HTTP request to the X-UI API"""
-        url = f"{self.base_url}{endpoint}"
-        response = self.session.request(method, url, **kwargs)
+        response = self._send(method, endpoint, **kwargs)
         response.raise_for_status()
         return response.json()
+
+    @staticmethod
+    def _accept_success(response: requests.Response) -> bool:
+        """Accept a 200 whose body is a JSON object with a truthy ``success``.
+
+        An expired session can come back as a 200 HTML login page, so a body
+        that does not decode is treated as not accepted rather than raising.
+        """
+        if response.status_code != 200:
+            return False
+        try:
+            data = response.json()
+        except ValueError:
+            return False
+        return isinstance(data, dict) and bool(data.get('success'))
+
+    def _call_with_fallback(
+        self,
+        key: str,
+        candidates: List[Tuple[str, str]],
+        accept: Callable[[requests.Response], bool] = lambda r: r.status_code == 200
+    ) -> Tuple[Optional[requests.Response], Optional[int]]:
+        """Call the first of several equivalent endpoints that this panel supports.
+
+        ``candidates`` is an ordered list of ``(method, endpoint)`` pairs. The
+        index of the first accepted one is remembered under ``key`` so later
+        calls go straight to it. If the remembered endpoint raises or its
+        response is not accepted, it is dropped and the other candidates are
+        probed again.
+
+        Returns:
+            Tuple of the last response received (or None) and the index of the
+            accepted candidate (or None if none was accepted)
+        """
+        response = None
+        cached = self._endpoint_cache.pop(key, None)
+        if cached is not None:
+            method, endpoint = candidates[cached]
+            try:
+                response = self._send(method, endpoint)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Endpoint {endpoint} failed for {key}: {str(e)}")
+            else:
+                if accept(response):
+                    self._endpoint_cache[key] = cached
+                    return response, cached
+
+        for index, (method, endpoint) in enumerate(candidates):
+            if index == cached:
+                continue
+            try:
+                response = self._send(method, endpoint)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Endpoint {endpoint} failed for {key}: {str(e)}")
+                continue
+            if accept(response):
+                self._endpoint_cache[key] = index
+                return response, index
+        return response, None
+
+    def _iter_inbounds(self) -> Iterator[Dict]:
+        """Yield inbounds from the list endpoint without decoding the body to str.
+
+        Small responses are parsed in one go with orjson; responses of unknown
+        size or at least ``stream_threshold`` bytes are walked item by item
+        with ijson so the full object graph never sits in memory at once.
+        """
+        with self._send('GET', '/panel/api/inbounds/list', stream=True) as response:
+            response.raise_for_status()
+            size = int(response.headers.get('Content-Length') or 0)
+            if 0 < size < self.stream_threshold:
+                yield from orjson.loads(response.content).get("obj") or []
+                return
+            response.raw.decode_content = True
+            yield from ijson.items(response.raw, 'obj.item', use_float=True)
     
     def get_clients(self, telegram_id: Optional[int] = None) -> List[Dict]:
-        """Get all clients or filter by telegram_id"""
-        response = self._make_request("GET", "/panel/api/inbounds/list")
+        """Get all clients or filter by telegram_id.
+
+        Per-user lists are cached in Redis for CLIENTS_CACHE_TTL seconds when
+        REDIS_URL is set.
+        """
+        if not telegram_id or self._redis is None:
+            return self._load_clients(telegram_id)
+
+        key = f"xui:clients:{telegram_id}"
+        try:
+            cached = self._redis.get(key)
+            if cached:
+                return orjson.loads(cached)
+        except redis.RedisError as e:
+            logger.warning(f"Redis read failed for {key}: {str(e)}")
+
+        clients = self._load_clients(telegram_id)
+        try:
+            self._redis.set(key, orjson.dumps(clients), ex=CLIENTS_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"Redis write failed for {key}: {str(e)}")
+        return clients
+
+    def _invalidate_clients(self, client: Dict) -> None:
+        """Drop the cached client list of the user owning ``client``"""
+        telegram_id = client["settings"].get("tgId")
+        if not telegram_id or self._redis is None:
+            return
+        try:
+            self._redis.delete(f"xui:clients:{telegram_id}")
+        except redis.RedisError as e:
+            logger.warning(f"Redis invalidation failed for {telegram_id}: {str(e)}")
+
+    def _load_clients(self, telegram_id: Optional[int] = None) -> List[Dict]:
         clients = []
-        
-        tehran_tz = pytz.timezone('Asia/Tehran')
 
-        for inbound in response["obj"]:
+        for inbound in self._iter_inbounds():
             inbound_id = inbound["id"]
             # Ensure settings is a dictionary, parse if it's a string
             settings_raw = inbound.get("settings")
             if isinstance(settings_raw, str):
                 try:
-                    settings = json.loads(settings_raw)
-                except json.JSONDecodeError:
+                    settings = orjson.loads(settings_raw)
+                except orjson.JSONDecodeError:
                     # Log error or handle as appropriate if settings are malformed
                     settings = {"clients": []} # Default to empty if parsing fails
             elif isinstance(settings_raw, dict):
@@ -282,6 +464,7 @@ class XUIClient:
         client_data["total_gb"] = gb
         
         self._make_request("PUT", endpoint, json=client_data)
+        self._invalidate_clients(client)
     
     def set_expiry(self, client_uuid: str, days: int):
         """Set expiry date for a client"""
@@ -299,6 +482,7 @@ class XUIClient:
         
         client_data["expiryTime"] = expiry_time
         self._make_request("PUT", endpoint, json=client_data)
+        self._invalidate_clients(client)
     
     def reset_traffic(self, client_uuid: str):
         """Reset traffic usage for a client"""
@@ -310,21 +494,17 @@ class XUIClient:
         inbound_id = client['inbound_id']
         email = client['email']
         
-        # Try the new API endpoint first
         try:
-            endpoint = f"/panel/api/inbounds/{inbound_id}/resetClientTraffic/{email}"
-            response = self.session.post(f'{self.base_url}{endpoint}')
-            if response.status_code == 200:
-                return True
-        except Exception as e:
-            print(f"Error using new API endpoint: {str(e)}")
-            
-        # Fallback to the old endpoint as last resort
-        try:
-            endpoint = f"/api/inbound/{inbound_id}/client/{client_uuid}/reset"
-            self._make_request("POST", endpoint)
+            _, index = self._call_with_fallback('reset_traffic', [
+                ('POST', f"/panel/api/inbounds/{inbound_id}/resetClientTraffic/{email}"),
+                ('POST', f"/api/inbound/{inbound_id}/client/{client_uuid}/reset"),  # Old endpoint
+            ])
+            if index is None:
+                return False
+            self._invalidate_clients(client)
             return True
-        except:
+        except Exception as e:
+            logger.error(f"Error resetting traffic: {str(e)}", exc_info=True)
             return False
     
     def set_unlimited(self, client_uuid: str):
@@ -339,6 +519,7 @@ class XUIClient:
         client_data["expiryTime"] = 0  # Never expires
         
         self._make_request("PUT", endpoint, json=client_data)
+        self._invalidate_clients(client)
     
     def delete_client(self, client_uuid: str) -> bool:
         """Delete a client by UUID"""
@@ -349,25 +530,37 @@ class XUIClient:
             
             inbound_id = client['inbound_id']
             
-            # Use the documented endpoint
-            endpoint = f"/panel/api/inbounds/{inbound_id}/delClient/{client_uuid}"
-            response = self.session.post(f'{self.base_url}{endpoint}')
-            
-            if response.status_code == 200:
-                return True
-            else:
+            response, index = self._call_with_fallback('delete_client', [
+                ('POST', f"/panel/api/inbounds/{inbound_id}/delClient/{client_uuid}"),
+                ('DELETE', f"/api/inbound/{inbound_id}/client/{client_uuid}"),  # Old endpoint
+            ])
+            if index is None and response is not None:
                 print(f"Error deleting client: {response.status_code} - {response.text}")
-                
-                # Try fallback endpoint
-                endpoint = f"/api/inbound/{inbound_id}/client/{client_uuid}"
-                response = self.session.delete(f'{self.base_url}{endpoint}')
-                return response.status_code == 200
+            self._invalidate_clients(client)
+            return index is not None
         except Exception as e:
             print(f"Exception deleting client: {str(e)}")
             return False
 
+    @staticmethod
+    def _merge_client_obj(obj: Any) -> Dict[str, Any]:
+        """Normalize a panel client object (or a one-element list of them) for get_client_info."""
+        if isinstance(obj, list):
+            if not obj:
+                return {}
+            obj = obj[0]
+        if not isinstance(obj, dict):
+            return {}
+        return {
+            **obj,
+            'expire_time': obj.get('expiryTime', 0),
+            'last_connection': obj.get('lastConnection', 0),
+            'created_at': obj.get('createdAt', 0)
+        }
+
     def get_client_info(self, uuid: Optional[str] = None, email: Optional[str] = None, inbound_id: Optional[int] = None) -> Dict[str, Any]:
         """Get client information by UUID or email and optionally inbound_id"""
+        date_debug_logger = _get_date_debug_logger()
         try:
             logger.info(f"Getting client info for UUID: {uuid} or email: {email}, inbound_id: {inbound_id}")
             date_debug_logger.info(f"=== NEW CALL: uuid={uuid}, email={email}, inbound_id={inbound_id} ===")
@@ -424,16 +617,13 @@ class XUIClient:
                                 if (uuid and client.get('id') == uuid) or (email and client.get('email') == email):
                                     logger.info(f"Found matching client: {client}")
                                     # Update client data instead of replacing it
-                                    client_data.update({
-                                        **client,
-                                        'inbound_id': inbound_id,
-                                        'protocol': inbound_info.get('protocol', 'unknown'),
-                                        'port': inbound_info.get('port', 0),
-                                        'is_online': is_online,
-                                        'expire_time': client.get('expiryTime', 0),
-                                        'last_connection': client.get('lastConnection', 0),
-                                        'created_at': client.get('createdAt', 0)
-                                    })
+                                    client_data.update(
+                                        self._merge_client_obj(client),
+                                        inbound_id=inbound_id,
+                                        protocol=inbound_info.get('protocol', 'unknown'),
+                                        port=inbound_info.get('port', 0),
+                                        is_online=is_online
+                                    )
                                     logger.info(f"Updated client data: {client_data}")
                                     break
                 except Exception as e:
@@ -448,23 +638,9 @@ class XUIClient:
                         logger.info(f"API response for UUID {uuid}: {data}")
                         
                         if data.get('success'):
-                            obj = data.get('obj', [])
-                            if isinstance(obj, list) and obj:
-                                client_data.update({
-                                    **obj[0],
-                                    'is_online': is_online,
-                                    'expire_time': obj[0].get('expiryTime', 0),
-                                    'last_connection': obj[0].get('lastConnection', 0),
-                                    'created_at': obj[0].get('createdAt', 0)
-                                })
-                            elif isinstance(obj, dict):
-                                client_data.update({
-                                    **obj,
-                                    'is_online': is_online,
-                                    'expire_time': obj.get('expiryTime', 0),
-                                    'last_connection': obj.get('lastConnection', 0),
-                                    'created_at': obj.get('createdAt', 0)
-                                })
+                            merged = self._merge_client_obj(data.get('obj', []))
+                            if merged:
+                                client_data.update(merged, is_online=is_online)
                             logger.info(f"Client data from API: {client_data}")
                     except Exception as e:
                         logger.error(f"Error getting client info by UUID {uuid}: {str(e)}")
@@ -475,23 +651,9 @@ class XUIClient:
                         logger.info(f"API response for email {email}: {data}")
                         
                         if data.get('success'):
-                            obj = data.get('obj', [])
-                            if isinstance(obj, list) and obj:
-                                client_data.update({
-                                    **obj[0],
-                                    'is_online': is_online,
-                                    'expire_time': obj[0].get('expiryTime', 0),
-                                    'last_connection': obj[0].get('lastConnection', 0),
-                                    'created_at': obj[0].get('createdAt', 0)
-                                })
-                            elif isinstance(obj, dict):
-                                client_data.update({
-                                    **obj,
-                                    'is_online': is_online,
-                                    'expire_time': obj.get('expiryTime', 0),
-                                    'last_connection': obj.get('lastConnection', 0),
-                                    'created_at': obj.get('createdAt', 0)
-                                })
+                            merged = self._merge_client_obj(data.get('obj', []))
+                            if merged:
+                                client_data.update(merged, is_online=is_online)
                             logger.info(f"Client data from API: {client_data}")
                     except Exception as e:
                         logger.error(f"Error getting client info by email {email}: {str(e)}")
@@ -526,4 +688,14 @@ class XUIClient:
         except Exception as e:
             logger.error(f"Error getting client info: {str(e)}")
             date_debug_logger.error(f"Exception in get_client_info: {e}")
-            return {} 
\ No newline at end of file
+            return {}
+
+
+def get_client() -> XUIClient:
+    """Return the process-wide XUIClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = XUIClient()
+    return _client
@@ -1,32 +1,34 @@
 import os
+import asyncio
 from datetime import datetime
-import telebot
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_handler_backends import BaseMiddleware, CancelUpdate
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, Message, CallbackQuery
 from telebot.util import escape_markdown
 from sqlalchemy.orm import Session
 from typing import Optional
 import time
-import traceback
+from functools import lru_cache
+from itertools import batched
 import logging
 
 logger = logging.getLogger(__name__)
 
-from ..models.base import SessionLocal
+from ..models.base import SessionLocal, engine, get_db
+from ..database.db import Database
 from ..models.models import TelegramUser, UserActivity, ChatHistory, VPNClient
-from ..api.xui_client import XUIClient
+from ..api.xui_client import get_client
+from ..utils.rate_limiter import TokenBucketLimiter
 from proj import *
 
 # Initialize bot with hardcoded token
 BOT_TOKEN = BOT_TOKEN  # Replace with your Telegram bot token
-bot = telebot.TeleBot(BOT_TOKEN)
-xui_client = XUIClient()
+bot = AsyncTeleBot(BOT_TOKEN)
+xui_client = get_client()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        db.close()
+# Per-user request budget
+RATE_LIMIT_MESSAGES = 30
+RATE_LIMIT_WINDOW = 60  # seconds
 
 def save_user_activity(db: Session, user_id: int, activity_type: str, target_uuid: Optional[str] = None, details: dict = None):
     activity = UserActivity(
@@ -62,52 +64,43 @@ def get_or_create_user(db: Session, telegram_user) -> TelegramUser:
         db.refresh(user)
     return user
 
+# Rows of (label, callback_data pattern); only the uuid changes per client
+_STATUS_USER_TEMPLATE = (
+    (("🔄 بروزرسانی وضعیت", "refresh_{uuid}"),),
+)
+_STATUS_ADMIN_TEMPLATE = _STATUS_USER_TEMPLATE + (
+    # Traffic control buttons
+    (("🎯 تنظیم حجم", "traffic_{uuid}"), ("♻️ ریست حجم", "reset_{uuid}")),
+    (("♾️ حجم نامحدود", "unlimited_{uuid}"), ("🔢 حجم دلخواه", "custom_traffic_{uuid}")),
+    # Expiry control buttons
+    (("🗓️ تنظیم تاریخ انقضا", "expiry_{uuid}"),),
+    # IP management buttons
+    (("👀 مشاهده IPها", "ips_{uuid}"),),
+)
+
+# Keyboards are cached per uuid and shared between updates; callers must not mutate them
+@lru_cache(maxsize=8192)
 def create_client_status_keyboard(client_uuid: str, is_admin: bool) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup()
-    keyboard.row(
-        InlineKeyboardButton("🔄 بروزرسانی وضعیت", callback_data=f"refresh_{client_uuid}")
-    )
-    
-    if is_admin:
-        # Traffic control buttons
-        keyboard.row(
-            InlineKeyboardButton("🎯 تنظیم حجم", callback_data=f"traffic_{client_uuid}"),
-            InlineKeyboardButton("♻️ ریست حجم", callback_data=f"reset_{client_uuid}")
-        )
-        keyboard.row(
-            InlineKeyboardButton("♾️ حجم نامحدود", callback_data=f"unlimited_{client_uuid}"),
-            InlineKeyboardButton("🔢 حجم دلخواه", callback_data=f"custom_traffic_{client_uuid}")
-        )
-        
-        # Expiry control buttons
-        keyboard.row(
-            InlineKeyboardButton("🗓️ تنظیم تاریخ انقضا", callback_data=f"expiry_{client_uuid}")
-        )
-        
-        # IP management buttons
-        keyboard.row(
-            InlineKeyboardButton("👀 مشاهده IPها", callback_data=f"ips_{client_uuid}")
-        )
-    
+    template = _STATUS_ADMIN_TEMPLATE if is_admin else _STATUS_USER_TEMPLATE
+    for row in template:
+        keyboard.row(*[
+            InlineKeyboardButton(label, callback_data=pattern.format(uuid=client_uuid))
+            for label, pattern in row
+        ])
     return keyboard
 
+@lru_cache(maxsize=8192)
 def create_traffic_options_keyboard(client_uuid: str) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup()
     traffic_options = [10, 20, 30, 50, 100]
     
     # Create rows with two buttons each
-    for i in range(0, len(traffic_options), 2):
-        row = []
-        row.append(InlineKeyboardButton(
-            f"{traffic_options[i]}GB",
-            callback_data=f"settraffic_{client_uuid}_{traffic_options[i]}"
-        ))
-        if i + 1 < len(traffic_options):
-            row.append(InlineKeyboardButton(
-                f"{traffic_options[i+1]}GB",
-                callback_data=f"settraffic_{client_uuid}_{traffic_options[i+1]}"
-            ))
-        keyboard.row(*row)
+    for chunk in batched(traffic_options, 2):
+        keyboard.row(*[
+            InlineKeyboardButton(f"{gb}GB", callback_data=f"settraffic_{client_uuid}_{gb}")
+            for gb in chunk
+        ])
     
     # Add custom traffic input button
     keyboard.row(
@@ -118,20 +111,17 @@ def create_traffic_options_keyboard(client_uuid: str) -> InlineKeyboardMarkup:
     keyboard.row(InlineKeyboardButton("🔙 بازگشت", callback_data=f"back_{client_uuid}"))
     return keyboard
 
+@lru_cache(maxsize=8192)
 def create_expiry_options_keyboard(client_uuid: str) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup()
     days_options = [1, 2, 3, 5, 10, 30, 60, 90, 120, 180]
     
     # Create rows with three buttons each
-    for i in range(0, len(days_options), 3):
-        row = []
-        for j in range(3):
-            if i + j < len(days_options):
-                row.append(InlineKeyboardButton(
-                    f"{days_options[i+j]} روز",
-                    callback_data=f"setexpiry_{client_uuid}_{days_options[i+j]}"
-                ))
-        keyboard.row(*row)
+    for chunk in batched(days_options, 3):
+        keyboard.row(*[
+            InlineKeyboardButton(f"{days} روز", callback_data=f"setexpiry_{client_uuid}_{days}")
+            for days in chunk
+        ])
     
     # Add unlimited option
     keyboard.row(
@@ -142,11 +132,73 @@ def create_expiry_options_keyboard(client_uuid: str) -> InlineKeyboardMarkup:
     keyboard.row(InlineKeyboardButton("🔙 بازگشت", callback_data=f"back_{client_uuid}"))
     return keyboard
 
+class GlobalMiddleware(BaseMiddleware):
+    """Drop messages while the bot is disabled and log the ones that get through"""
+
+    DISABLED_REPLY = "❌ *ربات در حال حاضر غیرفعال است*\\.\nلطفاً بعداً تلاش کنید\\."
+    # Admin commands still work while the bot is disabled
+    ADMIN_COMMANDS = frozenset(('toggle', 'users', 'logs', 'backup', 'broadcast', 'add'))
+
+    def __init__(self, owner: "Bot"):
+        super().__init__()
+        self.update_types = ['message', 'callback_query']
+        self.owner = owner
+
+    async def pre_process(self, message, data):
+        # Reject over-budget users before any DB or panel work
+        if message.from_user and not self.owner._check_rate_limit(message.from_user.id):
+            if isinstance(message, CallbackQuery):
+                await self.owner.bot.answer_callback_query(message.id, "⏳ لطفاً کمی صبر کنید")
+            return CancelUpdate()
+        if isinstance(message, CallbackQuery):
+            return None
+
+        db = self.owner.db
+        try:
+            # Check if bot is enabled
+            if not await asyncio.to_thread(db.get_bot_status):
+                # Allow admin commands even when bot is disabled
+                # Any whitespace ends the command, as with split()
+                words = message.text.split(maxsplit=1) if message.text else []
+                head = words[0] if words else ''
+                if head.startswith('/'):
+                    if head[1:].lower() in self.ADMIN_COMMANDS:
+                        return None
+                
+                # Send disabled message to non-admin users
+                if message.from_user:
+                    await self.owner.bot.reply_to(
+                        message,
+                        self.DISABLED_REPLY,
+                        parse_mode='MarkdownV2'
+                    )
+                return CancelUpdate()
+            
+            # Log message
+            if message.from_user:
+                await asyncio.to_thread(
+                    db.log_event,
+                    'INFO',
+                    'message_received',
+                    message.from_user.id,
+                    f"Received message: {message.text[:100]}",
+                    details={'message_id': message.message_id}
+                )
+        except Exception as e:
+            logger.error("Error in global middleware: %s", e, exc_info=True)
+        return None
+
+    async def post_process(self, message, data, exception):
+        pass
+
 class Bot:
-    def __init__(self, bot_instance):
+    def __init__(self, bot_instance: AsyncTeleBot):
         self.bot = bot_instance
-        self.db = get_db()
+        # Database opens a connection per call, so one instance is safe to share;
+        # ORM work takes its own short-lived session via get_db()
+        self.db = Database()
         self.xui_client = xui_client
+        self.rate_limiter = TokenBucketLimiter(RATE_LIMIT_MESSAGES, RATE_LIMIT_WINDOW)
         self._register_handlers()
 
     def _register_handlers(self):
@@ -155,38 +207,7 @@ class Bot:
             logger.info("Starting handler registration")
             
             # Register global middleware
-            @self.bot.middleware_handler(update_types=['message'])
-            def global_middleware(bot_instance, message):
-                try:
-                    # Check if bot is enabled
-                    if not self.db.get_bot_status():
-                        # Allow admin commands even when bot is disabled
-                        if message.text and message.text.startswith('/'):
-                            command = message.text.split()[0][1:].lower()
-                            if command in ['toggle', 'users', 'logs', 'backup', 'broadcast', 'add']:
-                                return message
-                        
-                        # Send disabled message to non-admin users
-                        if message.from_user:
-                            bot_instance.reply_to(
-                                message,
-                                "❌ *ربات در حال حاضر غیرفعال است*\\.\nلطفاً بعداً تلاش کنید\\.",
-                                parse_mode='MarkdownV2'
-                            )
-                        return None
-                    
-                    # Log message
-                    if message.from_user:
-                        self.db.log_event(
-                            'INFO',
-                            'message_received',
-                            message.from_user.id,
-                            f"Received message: {message.text[:100]}",
-                            details={'message_id': message.message_id}
-                        )
-                except Exception as e:
-                    logger.error(f"Error in global middleware: {str(e)}")
-                return message
+            self.bot.setup_middleware(GlobalMiddleware(self))
             
             # Register command handlers
             self.bot.message_handler(commands=['start'])(self.handle_start_cmd)
@@ -204,27 +225,27 @@ class Bot:
             logger.info("All handlers registered successfully")
             
         except Exception as e:
-            logger.error(f"Error registering handlers: {str(e)}\n{traceback.format_exc()}")
+            logger.error("Error registering handlers: %s", e, exc_info=True)
             raise
 
     def _check_rate_limit(self, user_id: int) -> bool:
-        # Implement rate limiting logic here
-        return True  # Placeholder, actual implementation needed
+        """Check if user has exceeded rate limit"""
+        return self.rate_limiter.allow(user_id)
 
-    def _send_error_message(self, message: Message):
+    async def _send_error_message(self, message: Message):
         # Implement error message sending logic here
         pass  # Placeholder, actual implementation needed
 
-    def start(self):
+    async def start(self):
         """Start the bot with proper error handling."""
         try:
             logger.info("Starting bot polling...")
-            self.bot.polling(none_stop=True, interval=0)
+            await self.bot.polling(non_stop=True, interval=0)
         except Exception as e:
-            logger.error(f"Error in bot polling: {str(e)}")
+            logger.error("Error in bot polling: %s", e, exc_info=True)
             raise
 
-    def shutdown(self):
+    async def shutdown(self):
         """Gracefully shutdown the bot."""
         try:
             logger.info("Received shutdown signal")
@@ -233,10 +254,12 @@ class Bot:
             # Stop the bot polling
             if hasattr(self, 'bot'):
                 self.bot.stop_polling()
+                await self.bot.close_session()
             
             # Cleanup database
             if hasattr(self, 'db'):
-                self.db.cleanup()
+                self.db.close()
+            engine.dispose()
             
             # Cleanup panel API
             if hasattr(self, 'panel_api'):
@@ -245,8 +268,8 @@ class Bot:
             logger.info("Cleanup completed")
             
         except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}")
+            logger.error("Error during cleanup: %s", e, exc_info=True)
 
 def run_bot():
-    print("Bot started...")
-    bot.infinity_polling() 
\ No newline at end of file
+    logger.info("Bot started")
+    asyncio.run(bot.polling())
@@ -1,12 +1,21 @@
 import mysql.connector
-from mysql.connector import Error as MySQLError
+from mysql.connector import pooling, HAVE_CEXT
+from mysql.connector import Error as MySQLError, IntegrityError, InterfaceError, OperationalError, PoolError
 from datetime import datetime
-import json
-from typing import Dict, List, Optional, Union
+import orjson
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Union
 from pathlib import Path
+import atexit
+import logging
+import os
+import random
 import time
-import traceback
+import queue
+import threading
 from contextlib import contextmanager
+from functools import lru_cache
+from cachetools import TTLCache
 
 from src.utils.logger import CustomLogger
 from src.utils.exceptions import *
@@ -15,12 +24,494 @@ from proj import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, ADMIN_IDS
 # Initialize custom logger
 logger = CustomLogger("Database")
 
-class DateTimeEncoder(json.JSONEncoder):
-    """Custom JSON encoder for datetime objects"""
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
+# Same normalisation as utils.decorators (not imported: it depends on this module)
+_ADMIN_ID_SET = frozenset(int(admin_id) for admin_id in ADMIN_IDS)
+
+# Pooled connections kept open per Database instance; DB_POOL_SIZE overrides.
+# mysql-connector refuses pools larger than CNX_POOL_MAXSIZE (32).
+POOL_SIZE = min(int(os.getenv('DB_POOL_SIZE', '25')), pooling.CNX_POOL_MAXSIZE)
+# How long get_connection waits for a free pooled connection before giving up
+POOL_WAIT_TIMEOUT = float(os.getenv('DB_POOL_WAIT', '5'))  # seconds
+
+# Log rows are queued and written by a background thread in batches
+LOG_QUEUE_SIZE = 10_000
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL = 0.1  # seconds
+
+# User row plus user_sessions aggregates; callers append the WHERE clause.
+# The aggregate total_usage comes after u.* so it wins in dictionary rows.
+USER_INFO_SELECT = """
+    SELECT
+        u.*,
+        COUNT(s.email) AS session_count,
+        COALESCE(SUM(s.data_usage), 0) AS total_usage,
+        MAX(s.connected_at) AS last_connection
+    FROM users u
+    LEFT JOIN user_sessions s ON s.email = u.email
+"""
+
+USER_INFO_BY_EMAIL_SQL = USER_INFO_SELECT + " WHERE u.email = %s GROUP BY u.id"
+USER_INFO_BY_TELEGRAM_SQL = USER_INFO_SELECT + " WHERE u.telegram_id = %s GROUP BY u.id"
+
+# Readers alias columns to the keys their callers expect
+USER_ACTIVITY_SQL = """
+    SELECT
+        activity_type AS type,
+        timestamp,
+        details,
+        ip_address
+    FROM user_activity
+    WHERE user_id = %s
+    ORDER BY timestamp DESC
+    LIMIT %s
+"""
+
+# User row, session aggregates and recent locations in one round-trip
+USER_STATS_SQL = """
+    SELECT
+        u.traffic_limit,
+        u.status,
+        u.expiry_date,
+        u.created_at,
+        COUNT(s.email) AS total_sessions,
+        COALESCE(SUM(s.data_usage), 0) AS session_usage,
+        MAX(s.connected_at) AS last_connection,
+        COUNT(DISTINCT s.ip_address) AS unique_ips,
+        COUNT(DISTINCT s.device_info) AS unique_devices,
+        (
+            SELECT JSON_ARRAYAGG(recent.location)
+            FROM (
+                SELECT location
+                FROM user_sessions
+                WHERE email = %s AND location IS NOT NULL
+                GROUP BY location
+                ORDER BY MAX(connected_at) DESC
+                LIMIT 5
+            ) recent
+        ) AS recent_locations
+    FROM users u
+    LEFT JOIN user_sessions s ON s.email = u.email
+    WHERE u.email = %s
+    GROUP BY u.id
+"""
+
+USER_CONTEXT_SQL = """
+    SELECT username, first_name, last_name, email
+    FROM users
+    WHERE telegram_id = %s
+"""
+
+INSERT_LOG_SQL = """
+    INSERT INTO logs (
+        timestamp, level, event_type, user_id, message, details
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+# Served entirely by idx_logs_user_event_time: equality on (user_id, event_type),
+# then a range scan on timestamp that also yields the ORDER BY. The bound is a
+# naive local datetime, matching the datetime.now() values the writers store.
+USER_MESSAGES_SQL = """
+    SELECT timestamp, message, details
+    FROM logs
+    WHERE user_id = %s
+    AND event_type = 'message_received'
+    AND timestamp >= %s
+    ORDER BY timestamp DESC
+"""
+
+# Inserts the session only if the user exists, stamped by the server clock
+INSERT_SESSION_SQL = """
+    INSERT INTO user_sessions (
+        email, ip_address, connected_at, data_usage,
+        device_info, location, connection_type
+    )
+    SELECT %s, %s, NOW(), %s, %s, %s, %s
+    FROM users
+    WHERE email = %s
+"""
+
+USER_EXISTS_SQL = "SELECT 1 FROM users WHERE email = %s LIMIT 1"
+
+# Log-style tables below are written by the background log writer
+INSERT_SHARED_LINK_SQL = """
+    INSERT INTO shared_links (
+        user_id, link_type, link_url, title, description,
+        message_id, chat_id, expiry_date
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_BOT_COMMAND_SQL = """
+    INSERT INTO bot_commands (
+        command_name, user_id, args, result, execution_time,
+        status, error_message, session_id, command_metadata,
+        performance_metrics, user_context, timestamp
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_SYSTEM_METRIC_SQL = """
+    INSERT INTO system_metrics (
+        metric_type, metric_value, details
+    ) VALUES (%s, %s, %s)
+"""
+
+INSERT_CHAT_MESSAGE_SQL = """
+    INSERT INTO chat_history (
+        user_id, message_id, chat_id, message_type, content,
+        reply_to_message_id, forward_from_id, is_command,
+        command_name, command_args, bot_response, response_time
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_EVENT_SQL = """
+    INSERT INTO logs (
+        level, event_type, user_id, message, details, timestamp
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_ADMIN_ACTION_SQL = """
+    INSERT INTO admin_actions (
+        admin_id, action_type, target_user,
+        timestamp, details, ip_address, status
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_ACTIVITY_SQL = """
+    INSERT INTO user_activity (
+        user_id, activity_type, timestamp, details
+    ) VALUES (%s, %s, %s, %s)
+"""
+
+# log queue table -> statement its rows are written with, for rows that
+# need no work in the writer ('logs' events are serialized first)
+QUEUED_INSERTS = {
+    'admin_actions': INSERT_ADMIN_ACTION_SQL,
+    'user_activity': INSERT_ACTIVITY_SQL,
+    'command_errors': INSERT_LOG_SQL,
+    'chat_history': INSERT_CHAT_MESSAGE_SQL,
+    'shared_links': INSERT_SHARED_LINK_SQL,
+    'bot_commands': INSERT_BOT_COMMAND_SQL,
+    'system_metrics': INSERT_SYSTEM_METRIC_SQL,
+}
+
+UPDATE_USER_STATS_SQL = """
+    UPDATE users
+    SET total_messages = total_messages + %s,
+        total_commands = total_commands + %s,
+        total_links = total_links + %s,
+        total_sessions = total_sessions + %s,
+        last_activity = CURRENT_TIMESTAMP
+    WHERE telegram_id = %s
+"""
+
+# get_user_activity_summary's four result sets, sent as one multi-statement
+ACTIVITY_SUMMARY_SQL = """
+    SELECT COUNT(*) as message_count
+    FROM chat_history
+    WHERE user_id = %s
+    AND created_at >= DATE_SUB(NOW(), INTERVAL %s DAY);
+
+    SELECT command_name, COUNT(*) as usage_count
+    FROM bot_commands
+    WHERE user_id = %s
+    AND timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
+    GROUP BY command_name;
+
+    SELECT link_type, COUNT(*) as share_count
+    FROM shared_links
+    WHERE user_id = %s
+    AND shared_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+    GROUP BY link_type;
+
+    SELECT COUNT(*) as session_count,
+           SUM(data_usage) as total_data_usage,
+           AVG(duration) as avg_session_duration
+    FROM user_sessions
+    WHERE user_id = %s
+    AND connected_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+"""
+
+# Missing table / unknown column: retrying the rows one by one can't help
+SCHEMA_ERRNOS = frozenset({1054, 1146})
+
+# Prepared statements kept open per pooled connection; the oldest is
+# closed on the server when a new one would exceed this
+PREPARED_PER_CONNECTION = 128
+
+# Rows per executemany in the bulk writers, keeping each rewritten
+# multi-row INSERT well under max_allowed_packet
+BULK_CHUNK_SIZE = 1000
+
+# How long a read of the bot on/off flag is trusted before asking MySQL again
+BOT_STATUS_TTL = 5  # seconds
+
+# zlib-compress the client protocol; worth it when MySQL is across a network,
+# wasted CPU on localhost. DB_COMPRESS=1/0 overrides the host-based default.
+DB_COMPRESS = os.getenv(
+    'DB_COMPRESS',
+    '0' if DB_HOST in ('localhost', '127.0.0.1', '::1') else '1'
+).lower() in ('1', 'true', 'yes')
+
+# XUI_LOG_ACTIVITY=0 stops recording successful commands in user_activity
+# (unless debug logging is on); failed commands are always recorded
+LOG_ACTIVITY = os.getenv('XUI_LOG_ACTIVITY', '1') != '0'
+# Successful commands store only command/status/timestamp in
+# user_activity.details; XUI_COMPACT_ACTIVITY=0 keeps the full payload
+COMPACT_ACTIVITY = os.getenv('XUI_COMPACT_ACTIVITY', '1') != '0'
+
+# How long get_user_info/get_user_stats results are served from memory
+USER_CACHE_TTL = 5  # seconds
+# Profile fields embedded in activity logs change rarely; writes invalidate them
+USER_CONTEXT_TTL = 300  # seconds
+
+# Driver errors worth retrying: lock wait timeout, deadlock, can't connect,
+# server gone away, lost connection. Anything else fails on the first try.
+RETRYABLE_ERRNOS = frozenset({1205, 1213, 2003, 2006, 2013})
+# Total time _execute_with_retry may spend backing off
+RETRY_BUDGET = 1.0  # seconds
+
+# Consecutive connection-level failures that open the circuit breaker, and
+# how long it then fails fast before letting a probe through
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 10  # seconds
+
+# One column list for every user insert, so the statement text never
+# varies; created_at is filled in by the column default
+_INSERT_USER = """
+    INSERT INTO users (
+        email, traffic_limit, expiry_date, status, total_usage,
+        telegram_id, username, first_name, last_name, language_code
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+def _user_insert_params(email: str, traffic_limit: int, expiry_date: str,
+                        telegram_info: Optional[Dict]) -> tuple:
+    """_INSERT_USER parameters; users without Telegram info bind NULLs"""
+    telegram_info = telegram_info or {}
+    return (
+        email, traffic_limit, expiry_date, 'active', 0,
+        telegram_info.get('user_id'),
+        telegram_info.get('username'),
+        telegram_info.get('first_name'),
+        telegram_info.get('last_name'),
+        # Same as the column default
+        telegram_info.get('language_code') or 'fa'
+    )
+
+@lru_cache(maxsize=64)
+def _update_user_sql(fields: tuple) -> str:
+    """UPDATE users statement for a (validated) set of columns"""
+    # last_modified is bumped by its ON UPDATE default
+    updates = ", ".join(f"{field} = %s" for field in fields) or "last_modified = NOW()"
+    return f"UPDATE users SET {updates} WHERE email = %s"
+
+def _json_default(obj):
+    """orjson fallback for types it doesn't encode natively (SUM() Decimals)"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _json_dumps(obj) -> str:
+    """Encode a JSON column value; datetimes come out as ISO strings
+
+    Decoded to str because MySQL rejects binary-charset input for JSON columns.
+    """
+    return orjson.dumps(obj, default=_json_default).decode()
+
+# Bump whenever SCHEMA_STATEMENTS changes; _init_db skips the DDL while
+# schema_meta already records this version
+SCHEMA_VERSION = 2
+
+SCHEMA_META_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS schema_meta (
+        id TINYINT PRIMARY KEY,
+        version INT NOT NULL
+    )
+    """,
+    f"""
+    INSERT INTO schema_meta (id, version) VALUES (1, {SCHEMA_VERSION})
+    ON DUPLICATE KEY UPDATE version = VALUES(version)
+    """,
+]
+
+# CREATE TABLE statements run by _init_db, in dependency order
+SCHEMA_STATEMENTS = [
+    # Create users table
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        telegram_id BIGINT UNIQUE,
+        username VARCHAR(255),
+        first_name VARCHAR(255),
+        last_name VARCHAR(255),
+        email VARCHAR(255) UNIQUE,
+        language_code VARCHAR(10) DEFAULT 'fa',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_modified DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        last_activity DATETIME,
+        status VARCHAR(20) DEFAULT 'active',
+        traffic_limit BIGINT DEFAULT 0,
+        total_usage BIGINT DEFAULT 0,
+        expiry_date DATETIME,
+        is_active BOOLEAN DEFAULT TRUE,
+        is_admin BOOLEAN DEFAULT FALSE,
+        state VARCHAR(50),
+        chat_id BIGINT,
+        last_chat_message DATETIME,
+        chat_message_count INT DEFAULT 0,
+        total_sessions INT DEFAULT 0,
+        last_session_at DATETIME,
+        active_sessions INT DEFAULT 0,
+        session_count_24h INT DEFAULT 0
+    )
+    """,
+
+    # Create telegram_users table
+    """
+    CREATE TABLE IF NOT EXISTS telegram_users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        telegram_id BIGINT UNIQUE,
+        username VARCHAR(255),
+        first_name VARCHAR(255),
+        last_name VARCHAR(255),
+        language_code VARCHAR(10) DEFAULT 'fa',
+        created_at DATETIME,
+        last_activity DATETIME,
+        is_admin BOOLEAN DEFAULT FALSE,
+        status VARCHAR(20) DEFAULT 'active'
+    )
+    """,
+
+    # Create bot_status table
+    """
+    CREATE TABLE IF NOT EXISTS bot_status (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        is_enabled BOOLEAN DEFAULT TRUE,
+        last_updated DATETIME,
+        updated_by INT,
+        reason TEXT,
+        FOREIGN KEY (updated_by) REFERENCES users(telegram_id)
+    )
+    """,
+
+    # Create chat_history table
+    """
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id BIGINT,
+        message_id BIGINT,
+        chat_id BIGINT,
+        message_type VARCHAR(50),
+        content TEXT,
+        reply_to_message_id BIGINT,
+        forward_from_id BIGINT,
+        timestamp DATETIME,
+        edited_at DATETIME,
+        deleted_at DATETIME,
+        is_command BOOLEAN DEFAULT FALSE,
+        command_name VARCHAR(50),
+        command_args TEXT,
+        bot_response TEXT,
+        response_time INT,
+        status VARCHAR(20) DEFAULT 'sent',
+        INDEX idx_chat_history_user_time (user_id, timestamp),
+        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
+    )
+    """,
+
+    # Create user_activity table
+    """
+    CREATE TABLE IF NOT EXISTS user_activity (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id BIGINT,
+        activity_type VARCHAR(50),
+        timestamp DATETIME,
+        details JSON,
+        INDEX idx_user_activity_user_time (user_id, timestamp),
+        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
+    )
+    """,
+
+    # Create logs table
+    """
+    CREATE TABLE IF NOT EXISTS logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        timestamp DATETIME,
+        level VARCHAR(20),
+        event_type VARCHAR(50),
+        user_id BIGINT,
+        message TEXT,
+        details JSON,
+        INDEX idx_logs_user_event_time (user_id, event_type, timestamp),
+        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
+    )
+    """,
+
+    # Create admin_actions table
+    """
+    CREATE TABLE IF NOT EXISTS admin_actions (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        admin_id BIGINT,
+        action_type VARCHAR(50),
+        target_user VARCHAR(255),
+        timestamp DATETIME,
+        details JSON,
+        ip_address VARCHAR(45),
+        status VARCHAR(20),
+        INDEX idx_admin_actions_admin_time (admin_id, timestamp)
+    )
+    """,
+
+    # Create bot_commands table
+    """
+    CREATE TABLE IF NOT EXISTS bot_commands (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        command_name VARCHAR(50),
+        user_id BIGINT,
+        args TEXT,
+        result TEXT,
+        execution_time INT,
+        timestamp DATETIME,
+        status VARCHAR(20),
+        error_message TEXT,
+        session_id VARCHAR(50),
+        command_metadata JSON,
+        performance_metrics JSON,
+        user_context JSON,
+        INDEX idx_bot_commands_user_time (user_id, timestamp),
+        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
+    )
+    """,
+
+    # Create system_metrics table
+    """
+    CREATE TABLE IF NOT EXISTS system_metrics (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        metric_type VARCHAR(50),
+        metric_value DOUBLE,
+        details JSON,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_system_metrics_type_time (metric_type, timestamp)
+    )
+    """,
+
+    # Create shared_links table
+    """
+    CREATE TABLE IF NOT EXISTS shared_links (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id BIGINT,
+        link_type VARCHAR(50),
+        link_url TEXT,
+        title VARCHAR(255),
+        description TEXT,
+        message_id BIGINT,
+        chat_id BIGINT,
+        created_at DATETIME,
+        expiry_date DATETIME,
+        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
+    )
+    """,
+]
 
 class Database:
     def __init__(self, db_name: str = "xui_bot"):
@@ -29,15 +520,50 @@ class Database:
                 'host': DB_HOST,
                 'user': DB_USER,
                 'password': DB_PASSWORD,
-                'database': DB_NAME
+                'database': DB_NAME,
+                'compress': DB_COMPRESS,
+                # Single statements commit on their own; multi-statement
+                # writers open an explicit transaction with start_transaction()
+                'autocommit': True,
+                # Use the C extension (libmysqlclient) shipped in the
+                # mysql-connector wheels; the pure-Python protocol is the fallback
+                'use_pure': not HAVE_CEXT
             }
+            if not HAVE_CEXT:
+                logger.warning("mysql-connector C extension not available, using the pure-Python driver")
+            self._bot_status: Optional[bool] = None
+            self._bot_status_checked = 0.0
+            self._log_q: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+            self._log_write_lock = threading.Lock()
+            # connection_id -> {(sql, dictionary): prepared cursor, None: plain
+            # cursor}; see _prepared() and _cursor()
+            self._stmts: Dict[int, Dict[Optional[tuple], object]] = {}
+            self._stmts_lock = threading.Lock()
+            self._breaker = {'fails': 0, 'opened_at': 0.0}
+            # ('email' | 'tg' | 'stats', identifier) -> row dict
+            self._user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+            self._user_cache_lock = threading.Lock()
+            # telegram_id -> (username, first_name, last_name, email) or None
+            self._user_ctx_cache: TTLCache = TTLCache(maxsize=10_000, ttl=USER_CONTEXT_TTL)
             
             # Create database if not exists
             self._create_database()
+            # The pool opens all POOL_SIZE connections up front, so early
+            # requests don't pay the connect/auth handshake
+            self._pool = pooling.MySQLConnectionPool(
+                pool_name=f"xui_{id(self):x}",
+                pool_size=POOL_SIZE,
+                pool_reset_session=False,
+                **self.db_config
+            )
             self._init_db()
+            self._log_thread = threading.Thread(target=self._log_flusher, name="db-log-flusher", daemon=True)
+            self._log_thread.start()
+            # Don't lose queued rows if the process exits without close()
+            atexit.register(self.flush_logs)
             logger.info(f"Database initialized successfully: {db_name}")
         except Exception as e:
-            logger.critical(f"Failed to initialize database: {str(e)}\n{traceback.format_exc()}")
+            logger.critical(f"Failed to initialize database: {str(e)}", exc_info=True)
             raise DatabaseError("Failed to initialize database")
 
     def _create_database(self):
@@ -52,189 +578,220 @@ class Database:
             cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.db_config['database']}")
             conn.close()
         except MySQLError as e:
-            logger.error(f"Error creating database: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error creating database: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to create database: {str(e)}")
 
     def _init_db(self):
         """Initialize database tables"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Create users table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        telegram_id BIGINT UNIQUE,
-                        username VARCHAR(255),
-                        first_name VARCHAR(255),
-                        last_name VARCHAR(255),
-                        email VARCHAR(255) UNIQUE,
-                        language_code VARCHAR(10) DEFAULT 'fa',
-                        created_at DATETIME,
-                        last_activity DATETIME,
-                        status VARCHAR(20) DEFAULT 'active',
-                        traffic_limit BIGINT DEFAULT 0,
-                        total_usage BIGINT DEFAULT 0,
-                        expiry_date DATETIME,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        is_admin BOOLEAN DEFAULT FALSE,
-                        state VARCHAR(50),
-                        chat_id BIGINT,
-                        last_chat_message DATETIME,
-                        chat_message_count INT DEFAULT 0,
-                        total_sessions INT DEFAULT 0,
-                        last_session_at DATETIME,
-                        active_sessions INT DEFAULT 0,
-                        session_count_24h INT DEFAULT 0
-                    )
-                """)
-                
-                # Create telegram_users table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS telegram_users (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        telegram_id BIGINT UNIQUE,
-                        username VARCHAR(255),
-                        first_name VARCHAR(255),
-                        last_name VARCHAR(255),
-                        language_code VARCHAR(10) DEFAULT 'fa',
-                        created_at DATETIME,
-                        last_activity DATETIME,
-                        is_admin BOOLEAN DEFAULT FALSE,
-                        status VARCHAR(20) DEFAULT 'active'
-                    )
-                """)
-                
-                # Create bot_status table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS bot_status (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        is_enabled BOOLEAN DEFAULT TRUE,
-                        last_updated DATETIME,
-                        updated_by INT,
-                        reason TEXT,
-                        FOREIGN KEY (updated_by) REFERENCES users(telegram_id)
-                    )
-                """)
-                
-                # Create chat_history table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS chat_history (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        user_id BIGINT,
-                        message_id BIGINT,
-                        chat_id BIGINT,
-                        message_type VARCHAR(50),
-                        content TEXT,
-                        reply_to_message_id BIGINT,
-                        forward_from_id BIGINT,
-                        timestamp DATETIME,
-                        edited_at DATETIME,
-                        deleted_at DATETIME,
-                        is_command BOOLEAN DEFAULT FALSE,
-                        command_name VARCHAR(50),
-                        command_args TEXT,
-                        bot_response TEXT,
-                        response_time INT,
-                        status VARCHAR(20) DEFAULT 'sent',
-                        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
-                    )
-                """)
-                
-                # Create user_activity table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS user_activity (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        user_id BIGINT,
-                        activity_type VARCHAR(50),
-                        timestamp DATETIME,
-                        details JSON,
-                        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
-                    )
-                """)
-                
-                # Create logs table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS logs (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        timestamp DATETIME,
-                        level VARCHAR(20),
-                        event_type VARCHAR(50),
-                        user_id BIGINT,
-                        message TEXT,
-                        details JSON,
-                        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
-                    )
-                """)
-                
-                # Create bot_commands table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS bot_commands (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        command_name VARCHAR(50),
-                        user_id BIGINT,
-                        args TEXT,
-                        result TEXT,
-                        execution_time INT,
-                        timestamp DATETIME,
-                        status VARCHAR(20),
-                        error_message TEXT,
-                        session_id VARCHAR(50),
-                        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
-                    )
-                """)
-                
-                # Create shared_links table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS shared_links (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        user_id BIGINT,
-                        link_type VARCHAR(50),
-                        link_url TEXT,
-                        title VARCHAR(255),
-                        description TEXT,
-                        message_id BIGINT,
-                        chat_id BIGINT,
-                        created_at DATETIME,
-                        expiry_date DATETIME,
-                        FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE
-                    )
-                """)
-                
-                conn.commit()
-                logger.info("Database tables created/verified successfully")
+            if self._schema_version() == SCHEMA_VERSION:
+                logger.info(f"Database schema is at version {SCHEMA_VERSION}, skipping table creation")
+                return
+            self.migrate(SCHEMA_STATEMENTS + SCHEMA_META_STATEMENTS)
+            logger.info("Database tables created/verified successfully")
                 
         except Exception as e:
-            logger.error(f"Error initializing database: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error initializing database: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to initialize database: {str(e)}")
 
+    def _schema_version(self) -> Optional[int]:
+        """Schema version recorded by _init_db, or None on a fresh database"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT version FROM schema_meta WHERE id = 1")
+            except MySQLError:
+                # No schema_meta table yet
+                return None
+            rows = cursor.fetchall()
+            return rows[0][0] if rows else None
+
+    def migrate(self, stmts: List[str]):
+        """Run schema/seed statements as one batch with a single commit
+
+        The statements go to the server as one multi-statement round-trip.
+        DDL still commits implicitly in MySQL, but seed inserts mixed in
+        share the final commit.
+        """
+        with self.get_connection() as conn:
+            conn.start_transaction()
+            cursor = conn.cursor()
+            for _ in cursor.execute(";\n".join(stmts), multi=True):
+                pass
+            conn.commit()
+
     @contextmanager
     def get_connection(self):
-        """Get a database connection with automatic closing"""
+        """Borrow a pooled database connection, returned to the pool on exit"""
+        if self._breaker_open():
+            raise DatabaseError("Database unavailable, retry later")
         conn = None
         try:
-            conn = mysql.connector.connect(**self.db_config)
+            conn = self._borrow_connection()
             yield conn
+            self._breaker['fails'] = 0
         except MySQLError as e:
+            if isinstance(e, (InterfaceError, OperationalError)):
+                self._record_connection_failure()
             error_msg = str(e)
             if "Access denied" in error_msg:
                 logger.error(f"Database access denied. Please check credentials: {error_msg}")
             elif "Unknown column" in error_msg:
                 logger.error(f"Database schema error: {error_msg}")
             else:
-                logger.error(f"Database connection error: {error_msg}\n{traceback.format_exc()}")
+                logger.error(f"Database connection error: {error_msg}", exc_info=True)
             
-            if conn and conn.is_connected():
-                conn.close()
-            raise DatabaseError(f"Database error: {error_msg}")
+            raise DatabaseError(f"Database error: {error_msg}") from e
         finally:
-            if conn and conn.is_connected():
+            if conn is not None:
+                # Sessions aren't reset on return, so don't hand a half-open
+                # transaction (and its stale snapshot) to the next borrower
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except MySQLError:
+                    pass
                 conn.close()
 
+    def _borrow_connection(self):
+        """Take a pooled connection, waiting up to POOL_WAIT_TIMEOUT when all are in use"""
+        deadline = time.monotonic() + POOL_WAIT_TIMEOUT
+        delay = 0.01
+        while True:
+            try:
+                return self._pool.get_connection()
+            except PoolError as e:
+                # mysql-connector fails at once when the pool is exhausted
+                if time.monotonic() >= deadline:
+                    logger.error(f"Connection pool exhausted ({POOL_SIZE} in use) for {POOL_WAIT_TIMEOUT}s")
+                    raise DatabaseError("Database busy: connection pool exhausted") from e
+                time.sleep(delay)
+                delay = min(delay * 2, 0.2)
+
+    def _breaker_open(self) -> bool:
+        """True while the breaker is open and its cooldown hasn't elapsed"""
+        return (
+            self._breaker['fails'] >= BREAKER_THRESHOLD
+            and time.monotonic() - self._breaker['opened_at'] < BREAKER_COOLDOWN
+        )
+
+    def _record_connection_failure(self):
+        self._breaker['fails'] += 1
+        if self._breaker['fails'] >= BREAKER_THRESHOLD:
+            # (Re)open: a failed probe after the cooldown restarts it
+            if self._breaker['fails'] == BREAKER_THRESHOLD:
+                logger.warning(f"Database circuit breaker opened for {BREAKER_COOLDOWN}s")
+            self._breaker['opened_at'] = time.monotonic()
+
+    def invalidate_user(self, email: Optional[str] = None, telegram_id: Optional[int] = None):
+        """Drop cached info/stats for a user after it has been written"""
+        with self._user_cache_lock:
+            for key in (('email', email), ('tg', telegram_id)):
+                cached = self._user_cache.pop(key, None)
+                if cached:
+                    # The same row is cached under its other identifier too
+                    self._user_cache.pop(('email', cached.get('email')), None)
+                    self._user_cache.pop(('tg', cached.get('telegram_id')), None)
+                    self._user_cache.pop(('stats', cached.get('email')), None)
+                    self._user_ctx_cache.pop(cached.get('telegram_id'), None)
+            self._user_cache.pop(('stats', email), None)
+            self._user_ctx_cache.pop(telegram_id, None)
+
+    def _get_user_context(self, user_id: int) -> Optional[tuple]:
+        """(username, first_name, last_name, email) for a Telegram user, cached"""
+        with self._user_cache_lock:
+            if user_id in self._user_ctx_cache:
+                return self._user_ctx_cache[user_id]
+        with self.get_connection() as conn:
+            cursor = self._prepared(conn, USER_CONTEXT_SQL)
+            cursor.execute(USER_CONTEXT_SQL, (user_id,))
+            rows = cursor.fetchall()
+            user_info = rows[0] if rows else None
+        with self._user_cache_lock:
+            self._user_ctx_cache[user_id] = user_info
+        return user_info
+
+    def _conn_stmts(self, conn) -> Dict:
+        """Cursor cache for this server connection"""
+        with self._stmts_lock:
+            stmts = self._stmts.get(conn.connection_id)
+            if stmts is None:
+                if len(self._stmts) >= POOL_SIZE:
+                    # More ids than the pool holds: some connections reconnected
+                    self._evict_stale_stmts(conn)
+                stmts = self._stmts[conn.connection_id] = {}
+            return stmts
+
+    def _evict_stale_stmts(self, conn):
+        """Drop cached cursors of server connections that no longer exist
+
+        Called with _stmts_lock held. Live connections keep their entries, so
+        their prepared statements are reused rather than re-prepared.
+        """
+        cursor = conn.cursor()
+        try:
+            ids = list(self._stmts)
+            cursor.execute(
+                f"SELECT ID FROM information_schema.PROCESSLIST WHERE ID IN ({', '.join(['%s'] * len(ids))})",
+                ids
+            )
+            live = {row[0] for row in cursor.fetchall()}
+        except MySQLError as e:
+            logger.warning(f"Could not check for stale statement caches: {str(e)}")
+            return
+        finally:
+            cursor.close()
+        for connection_id in ids:
+            if connection_id in live:
+                continue
+            stale = self._stmts.pop(connection_id)
+            # The server freed these statements with the session. The pure-Python
+            # cursor closes by statement id over its (now reconnected) connection
+            # and could free a live statement, so only the C cursors are closed.
+            if not HAVE_CEXT:
+                continue
+            for cached in stale.values():
+                try:
+                    cached.close()
+                except MySQLError:
+                    pass
+
+    def _cursor(self, conn):
+        """Return this pooled connection's long-lived plain cursor
+
+        Shares the _stmts cache with _prepared(), so it lives as long as
+        the server connection. Callers must consume every result.
+        """
+        stmts = self._conn_stmts(conn)
+        cursor = stmts.get(None)
+        if cursor is None:
+            cursor = stmts[None] = conn.cursor()
+        return cursor
+
+    def _prepared(self, conn, sql: str, dictionary: bool = False):
+        """Return a prepared cursor for ``sql`` on this pooled connection
+
+        The server-side statement is prepared on first use and reused on
+        later borrows of the same connection. Entries are keyed by the
+        server connection id, so a reconnect starts a fresh set.
+        """
+        stmts = self._conn_stmts(conn)
+        cursor = stmts.get((sql, dictionary))
+        if cursor is None:
+            if len(stmts) >= PREPARED_PER_CONNECTION:
+                # Evict the oldest prepared statement (the plain cursor stays)
+                oldest = next(key for key in stmts if key is not None)
+                try:
+                    stmts.pop(oldest).close()
+                except MySQLError:
+                    pass
+            cursor = stmts[(sql, dictionary)] = conn.cursor(prepared=True, dictionary=dictionary)
+        return cursor
+
     def _execute_with_retry(self, query: str, params=None, max_retries: int = 3):
         """Execute a database query with retry logic and proper error handling"""
         last_error = None
+        deadline = time.monotonic() + RETRY_BUDGET
         for attempt in range(max_retries):
             try:
                 with self.get_connection() as conn:
@@ -243,25 +800,39 @@ class Database:
                         cursor.execute(query, params)
                     else:
                         cursor.execute(query)
-                    conn.commit()
                     return cursor
-            except MySQLError as e:
+            except (MySQLError, DatabaseError) as e:
+                # get_connection re-raises driver errors as DatabaseError from the original
                 last_error = e
+                driver_error = e if isinstance(e, MySQLError) else e.__cause__
+                # An exhausted pool carries no errno but is as transient as a lock wait
+                retryable = (
+                    isinstance(driver_error, PoolError)
+                    or getattr(driver_error, 'errno', None) in RETRYABLE_ERRNOS
+                )
+                if not retryable:
+                    logger.error(f"Database operation failed: {str(e)}\nQuery: {query}\nParams: {params}")
+                    raise DatabaseError(f"Database operation failed: {str(e)}") from e
                 logger.warning(
                     f"Database operation attempt {attempt + 1} failed: {str(e)}\n"
                     f"Query: {query}\nParams: {params}"
                 )
+                if self._breaker_open():
+                    break
                 if attempt < max_retries - 1:
-                    wait_time = 0.1 * (2 ** attempt)  # Exponential backoff
-                    logger.info(f"Retrying in {wait_time} seconds...")
+                    # Jittered exponential backoff so callers don't retry in lockstep
+                    wait_time = random.uniform(0.05, min(2.0, 0.1 * (2 ** attempt)))
+                    if time.monotonic() + wait_time > deadline:
+                        break
+                    logger.info(f"Retrying in {wait_time:.2f} seconds...")
                     time.sleep(wait_time)
                 continue
         
         logger.error(
-            f"Database operation failed after {max_retries} attempts: {str(last_error)}\n"
-            f"Query: {query}\nParams: {params}\n{traceback.format_exc()}"
+            f"Database operation failed after {attempt + 1} attempts: {str(last_error)}\n"
+            f"Query: {query}\nParams: {params}"
         )
-        raise DatabaseError(f"Database operation failed after {max_retries} attempts")
+        raise DatabaseError(f"Database operation failed after {attempt + 1} attempts")
 
     def add_user(self, email: str, traffic_limit: int, expiry_date: str, telegram_info: Dict = None) -> bool:
         """Add a new user with proper validation and error handling"""
@@ -274,45 +845,23 @@ class Database:
             if not expiry_date or not isinstance(expiry_date, str):
                 raise ValidationError("Invalid expiry date")
             
+            if telegram_info and not isinstance(telegram_info, dict):
+                raise ValidationError("Invalid telegram info format")
+            
             with self.get_connection() as conn:
-                cursor = conn.cursor()
+                cursor = self._prepared(conn, _INSERT_USER)
                 
-                # Check if user already exists
-                cursor.execute("SELECT email FROM users WHERE email = %s", (email,))
-                if cursor.fetchone():
+                # The UNIQUE keys reject existing users, so no lookup first
+                try:
+                    cursor.execute(_INSERT_USER, _user_insert_params(
+                        email, traffic_limit, expiry_date, telegram_info
+                    ))
+                except IntegrityError:
                     logger.warning(f"Attempted to add existing user: {email}")
                     return False
                 
-                # Prepare user data
-                user_data = {
-                    'email': email,
-                    'traffic_limit': traffic_limit,
-                    'expiry_date': expiry_date,
-                    'created_at': datetime.now().isoformat(),
-                    'status': 'active',
-                    'total_usage': 0
-                }
-                
-                # Add telegram info if provided
-                if telegram_info:
-                    if not isinstance(telegram_info, dict):
-                        raise ValidationError("Invalid telegram info format")
-                    user_data.update({
-                        'telegram_id': telegram_info.get('user_id'),
-                        'username': telegram_info.get('username'),
-                        'first_name': telegram_info.get('first_name'),
-                        'last_name': telegram_info.get('last_name'),
-                        'language_code': telegram_info.get('language_code')
-                    })
-                
-                # Build query dynamically
-                fields = ', '.join(user_data.keys())
-                placeholders = ', '.join(['%s'] * len(user_data))
-                query = f'INSERT INTO users ({fields}) VALUES ({placeholders})'
-                
-                cursor.execute(query, list(user_data.values()))
-                conn.commit()
-                
+                # Drop a cached "no such user" context for the new Telegram ID
+                self.invalidate_user(email=email, telegram_id=(telegram_info or {}).get('user_id'))
                 logger.info(f"User added successfully: {email}")
                 return True
                 
@@ -320,9 +869,52 @@ class Database:
             logger.error(f"Database integrity error adding user {email}: {str(e)}")
             return False
         except Exception as e:
-            logger.error(f"Error adding user {email}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error adding user {email}: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to add user: {str(e)}")
 
+    def add_users_bulk(self, rows: List[Dict]) -> int:
+        """Insert many users with one multi-row INSERT
+
+        Each row takes the add_user arguments as keys (``email``,
+        ``traffic_limit``, ``expiry_date`` and optional ``telegram_info``).
+        Existing emails are skipped. Returns the number of users inserted.
+        """
+        try:
+            for row in rows:
+                email = row.get('email')
+                if not email or not isinstance(email, str):
+                    raise ValidationError(f"Invalid email address: {email}")
+                if not isinstance(row.get('traffic_limit'), int) or row['traffic_limit'] <= 0:
+                    raise ValidationError(f"Invalid traffic limit for {email}")
+                if not row.get('expiry_date') or not isinstance(row['expiry_date'], str):
+                    raise ValidationError(f"Invalid expiry date for {email}")
+                if row.get('telegram_info') is not None and not isinstance(row['telegram_info'], dict):
+                    raise ValidationError(f"Invalid telegram info format for {email}")
+            
+            params_list = [
+                _user_insert_params(row['email'], row['traffic_limit'], row['expiry_date'], row.get('telegram_info'))
+                for row in rows
+            ]
+            
+            inserted = 0
+            if params_list:
+                with self.get_connection() as conn:
+                    conn.start_transaction()
+                    cursor = conn.cursor()
+                    # INSERT IGNORE skips existing users instead of failing the batch
+                    cursor.executemany(_INSERT_USER.replace("INSERT INTO", "INSERT IGNORE INTO", 1), params_list)
+                    inserted = cursor.rowcount
+                    conn.commit()
+                for row in rows:
+                    self.invalidate_user(email=row['email'], telegram_id=(row.get('telegram_info') or {}).get('user_id'))
+            
+            logger.info(f"Bulk-added {inserted} of {len(rows)} users")
+            return inserted
+                
+        except MySQLError as e:
+            logger.error(f"Database error bulk-adding users: {str(e)}", exc_info=True)
+            raise DatabaseError(f"Failed to add users: {str(e)}")
+
     def update_user(self, email: str, **kwargs) -> bool:
         """Update user information with proper validation and error handling"""
         try:
@@ -332,100 +924,62 @@ class Database:
             
             # Validate update data
             valid_fields = {
-                'traffic_limit', 'expiry_date', 'status', 'total_usage',
+                'traffic_limit', 'expiry_date', 'status',
                 'telegram_id', 'username', 'first_name', 'last_name',
                 'language_code', 'inbound_id'
             }
             
+            if 'total_usage' in kwargs:
+                # Readers sum user_sessions.data_usage; the users column is no longer read
+                raise ValidationError("total_usage is derived from user_sessions and cannot be updated")
+            
             invalid_fields = set(kwargs.keys()) - valid_fields
             if invalid_fields:
                 raise ValidationError(f"Invalid update fields: {', '.join(invalid_fields)}")
             
+            # Sorted so a column set always maps to the same prepared statement
+            fields = tuple(sorted(kwargs))
+            query = _update_user_sql(fields)
+            values = [kwargs[field] for field in fields]
+            values.append(email)
+            
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Check if user exists
-                cursor.execute("SELECT email FROM users WHERE email = %s", (email,))
-                if not cursor.fetchone():
-                    logger.warning(f"Attempted to update non-existent user: {email}")
-                    return False
-                
-                updates = []
-                values = []
-                
-                # Add update timestamp
-                kwargs['last_modified'] = datetime.now().isoformat()
-                
-                for key, value in kwargs.items():
-                    updates.append(f"{key} = %s")
-                    values.append(value)
-                
-                values.append(email)
-                query = f'''
-                    UPDATE users 
-                    SET {", ".join(updates)}
-                    WHERE email = %s
-                '''
-                
+                cursor = self._prepared(conn, query)
                 cursor.execute(query, values)
-                conn.commit()
-                
-                success = cursor.rowcount > 0
-                if success:
-                    logger.info(f"User {email} updated successfully")
-                else:
-                    logger.warning(f"No changes made for user {email}")
-                return success
+                # Nothing changed: either no such user or the values were already set
+                if cursor.rowcount == 0:
+                    probe = self._prepared(conn, USER_EXISTS_SQL)
+                    probe.execute(USER_EXISTS_SQL, (email,))
+                    if not probe.fetchall():
+                        logger.warning(f"Attempted to update non-existent user: {email}")
+                        return False
+                self.invalidate_user(email=email, telegram_id=kwargs.get('telegram_id'))
+                if kwargs.keys() & {'telegram_id', 'username', 'first_name', 'last_name'}:
+                    # The row's telegram_id may not be known here
+                    with self._user_cache_lock:
+                        self._user_ctx_cache.clear()
+                
+                logger.info(f"User {email} updated successfully")
+                return True
                 
         except MySQLError as e:
-            logger.error(f"Database error updating user {email}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Database error updating user {email}: {str(e)}", exc_info=True)
             return False
         except Exception as e:
-            logger.error(f"Error updating user {email}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error updating user {email}: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to update user: {str(e)}")
 
     def log_event(self, level: str, event_type: str, user_id: Optional[int], message: str, details: dict = None) -> bool:
-        """Log event with proper error handling"""
-        try:
-            # Prepare event details
-            event_details = {
-                'message': message,
-                'user_id': user_id,
-                'timestamp': datetime.now().isoformat(),
-                'additional_info': details or {}
-            }
-            
-            # Try to get user context if available, but don't fail if not found
-            # Skip user context lookup during initialization (when user_id is None)
-            if user_id is not None:
-                try:
-                    user_context = self.get_user_info(user_id, by_telegram=True)
-                    if user_context:
-                        event_details['user_context'] = user_context
-                except Exception as e:
-                    logger.debug(f"Could not get user context for event logging: {str(e)}")
-            
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO logs (
-                        level, event_type, user_id, message, details, timestamp
-                    ) VALUES (%s, %s, %s, %s, %s, NOW())
-                """, (
-                    level,
-                    event_type,
-                    user_id,
-                    message,
-                    json.dumps(event_details, cls=DateTimeEncoder)
-                ))
-                
-                conn.commit()
-                logger.debug(f"Event logged successfully: {event_type}")
-                return True
-                
-        except Exception as e:
-            logger.error(f"Error logging event: {str(e)}")
-            return False
+        """Queue an event for the background log writer; False if the queue is full"""
+        now = datetime.now()
+        # Prepare event details; user_context is attached by the writer
+        event_details = {
+            'message': message,
+            'user_id': user_id,
+            'timestamp': now,
+            'additional_info': details or {}
+        }
+        return self._enqueue_log('logs', (level, event_type, user_id, message, event_details, now))
 
     def log_admin_action(self, admin_id: int, action_type: str, 
                         target_user: str, details: Dict = None,
@@ -440,35 +994,186 @@ class Database:
             if status not in {'success', 'failed', 'pending'}:
                 raise ValidationError("Invalid status")
             
-            current_time = datetime.now().isoformat()
-            
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO admin_actions (
-                        admin_id, action_type, target_user, 
-                        timestamp, details, ip_address, status
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ''', (
-                    admin_id,
-                    action_type,
-                    target_user,
-                    current_time,
-                    json.dumps(details, cls=DateTimeEncoder) if details else None,
-                    ip_address,
-                    status
-                ))
-                conn.commit()
-                
-                logger.info(f"Admin action logged successfully: {action_type} by {admin_id}")
-                return True
+            return self._enqueue_log('admin_actions', (
+                admin_id,
+                action_type,
+                target_user,
+                datetime.now(),
+                _json_dumps(details) if details else None,
+                ip_address,
+                status
+            ))
                 
         except Exception as e:
-            logger.error(f"Error logging admin action: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error logging admin action: {str(e)}", exc_info=True)
             # Don't raise here to prevent logging failures from affecting main functionality
             return False
 
+    def _enqueue_log(self, table: str, row: tuple) -> bool:
+        try:
+            self._log_q.put_nowait((table, row))
+            return True
+        except queue.Full:
+            logger.warning(f"Log queue full, dropping {table} row")
+            return False
+
+    def _log_flusher(self):
+        """Write queued log rows every LOG_FLUSH_INTERVAL or LOG_BATCH_SIZE rows
+
+        Exits after writing its current batch once close() queues None.
+        """
+        while True:
+            item = self._log_q.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+            stop = False
+            while len(batch) < LOG_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._log_q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_log_batch(batch)
+            if stop:
+                return
+
+    def flush_logs(self):
+        """Write out every queued log row now (used on shutdown)"""
+        batch = []
+        while True:
+            try:
+                item = self._log_q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        for start in range(0, len(batch), LOG_BATCH_SIZE):
+            self._write_log_batch(batch[start:start + LOG_BATCH_SIZE])
+
+    def _serialize_events(self, conn, events: List[tuple]) -> List[tuple]:
+        """logs rows with user context attached and details serialized"""
+        # Context comes from the user info cache where possible, and one
+        # query on the writer's connection for the rest of the batch's users
+        user_ids = {int(row[2]) for row in events if row[2] is not None}
+        contexts = {}
+        with self._user_cache_lock:
+            for user_id in user_ids:
+                cached = self._user_cache.get(('tg', user_id))
+                if cached is not None:
+                    contexts[user_id] = cached
+        missing = user_ids - contexts.keys()
+        if missing:
+            try:
+                contexts.update(self._fetch_user_contexts(conn.cursor(dictionary=True), missing))
+            except Exception as e:
+                logger.debug(f"Could not get user context for event logging: {str(e)}")
+        
+        rows = []
+        for level, event_type, user_id, message, event_details, logged_at in events:
+            user_context = contexts.get(int(user_id)) if user_id is not None else None
+            if user_context:
+                event_details['user_context'] = user_context
+            rows.append((
+                level,
+                event_type,
+                user_id,
+                message,
+                _json_dumps(event_details),
+                logged_at
+            ))
+        return rows
+
+    def _write_log_batch(self, batch: List[tuple]):
+        events = [row for table, row in batch if table == 'logs']
+        # Ready-to-insert rows per table, e.g. command_errors holds
+        # pre-serialized logs rows in INSERT_LOG_SQL column order
+        queued_rows = {table: [] for table in QUEUED_INSERTS}
+        for table, row in batch:
+            if table in queued_rows:
+                queued_rows[table].append(row)
+        try:
+            with self._log_write_lock, self.get_connection() as conn:
+                # Context reads and serialization share the write connection
+                # but run before any transaction opens
+                event_rows = self._serialize_events(conn, events) if events else []
+                cursor = self._cursor(conn)
+                written = 0
+                for table, sql, rows in [('logs', INSERT_EVENT_SQL, event_rows)] + [
+                    (table, QUEUED_INSERTS[table], rows) for table, rows in queued_rows.items()
+                ]:
+                    if rows:
+                        written += self._write_table_rows(conn, cursor, table, sql, rows)
+                logger.debug(f"Logged {written} of {len(batch)} queued rows")
+        except Exception as e:
+            # Connection-level failure (or the breaker is open); retrying
+            # row by row would only fail again
+            logger.error(f"Dropping {len(batch)} log rows: {str(e)}")
+
+    def _write_table_rows(self, conn, cursor, table: str, sql: str, rows: List[tuple]) -> int:
+        """Insert one table's share of a log batch in its own transaction
+
+        A failure only affects this table's rows. Row-level errors (e.g.
+        an unknown user_id) are retried row by row so only the bad rows
+        are lost; schema errors drop the table's rows with one message.
+        Returns the number of rows written.
+        """
+        try:
+            conn.start_transaction()
+            cursor.executemany(sql, rows)
+            conn.commit()
+            return len(rows)
+        except MySQLError as e:
+            conn.rollback()
+            if isinstance(e, (InterfaceError, OperationalError)):
+                raise
+            if e.errno in SCHEMA_ERRNOS:
+                logger.error(f"Dropping {len(rows)} {table} rows, table schema mismatch: {str(e)}")
+                return 0
+            if len(rows) == 1:
+                logger.error(f"Error writing {table} row: {str(e)}")
+                return 0
+        
+        logger.warning(f"Error writing {len(rows)} {table} rows, retrying individually")
+        written = 0
+        for row in rows:
+            try:
+                cursor.execute(sql, row)
+                written += 1
+            except (InterfaceError, OperationalError):
+                raise
+            except MySQLError as e:
+                logger.error(f"Error writing {table} row: {str(e)}")
+        return written
+
+    def _fetch_user_contexts(self, cursor, telegram_ids) -> Dict[int, Dict]:
+        """Read user info for several Telegram ids at once, keyed by telegram_id
+
+        ``cursor`` must be a dictionary cursor.
+        """
+        telegram_ids = list(telegram_ids)
+        placeholders = ", ".join(["%s"] * len(telegram_ids))
+        cursor.execute(
+            USER_INFO_SELECT + f" WHERE u.telegram_id IN ({placeholders}) GROUP BY u.id",
+            telegram_ids
+        )
+        return {user_data['telegram_id']: user_data for user_data in cursor.fetchall()}
+
+    def _fetch_user_info(self, conn, identifier: Union[str, int], by_telegram: bool) -> Optional[Dict]:
+        """Read a user row and its session statistics in a single query"""
+        sql = USER_INFO_BY_TELEGRAM_SQL if by_telegram else USER_INFO_BY_EMAIL_SQL
+        cursor = self._prepared(conn, sql, dictionary=True)
+        cursor.execute(sql, (identifier,))
+        rows = cursor.fetchall()
+        return rows[0] if rows else None
+
     def get_user_info(self, identifier: Union[str, int], by_telegram: bool = False) -> Optional[Dict]:
         """Get user information with proper error handling"""
         try:
@@ -486,52 +1191,33 @@ class Database:
             elif not isinstance(identifier, str):
                 logger.debug(f"Invalid email format: {identifier}")
                 return None
+            
+            key = ('tg' if by_telegram else 'email', identifier)
+            with self._user_cache_lock:
+                cached = self._user_cache.get(key)
+            if cached is not None:
+                return dict(cached)
                 
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                if by_telegram:
-                    query = "SELECT * FROM users WHERE telegram_id = %s"
-                else:
-                    query = "SELECT * FROM users WHERE email = %s"
+                user_data = self._fetch_user_info(conn, identifier, by_telegram)
                 
-                cursor.execute(query, (identifier,))
-                row = cursor.fetchone()
-                
-                if not row:
+                if not user_data:
                     logger.debug(f"User not found: {identifier}")
                     return None
                 
-                # Get column names
-                columns = [description[0] for description in cursor.description]
-                user_data = dict(zip(columns, row))
-                
-                # Get additional user statistics
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as session_count,
-                        SUM(data_usage) as total_usage,
-                        MAX(connected_at) as last_connection
-                    FROM user_sessions 
-                    WHERE email = %s
-                """, (user_data['email'],))
-                
-                stats = cursor.fetchone()
-                if stats:
-                    user_data.update({
-                        'session_count': stats[0],
-                        'total_usage': stats[1] or 0,
-                        'last_connection': stats[2]
-                    })
-                
+                with self._user_cache_lock:
+                    if user_data.get('email') is not None:
+                        self._user_cache[('email', user_data['email'])] = user_data
+                    if user_data.get('telegram_id') is not None:
+                        self._user_cache[('tg', user_data['telegram_id'])] = user_data
                 logger.debug(f"User info retrieved successfully: {identifier}")
-                return user_data
+                return dict(user_data)
                 
         except MySQLError as e:
-            logger.error(f"Database error getting user info: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Database error getting user info: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to get user info: {str(e)}")
         except Exception as e:
-            logger.error(f"Error getting user info: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error getting user info: {str(e)}", exc_info=True)
             return None
 
     def record_session(self, email: str, ip_address: str, device_info: str = None,
@@ -547,50 +1233,102 @@ class Database:
             if data_usage < 0:
                 raise ValidationError("Data usage cannot be negative")
             
-            current_time = datetime.now().isoformat()
-            
             with self.get_connection() as conn:
-                cursor = conn.cursor()
+                cursor = self._prepared(conn, INSERT_SESSION_SQL)
                 
-                # Verify user exists
-                cursor.execute("SELECT email FROM users WHERE email = %s", (email,))
-                if not cursor.fetchone():
+                # Insert the session only if the user exists; usage totals are
+                # summed from user_sessions on read, so users isn't touched
+                try:
+                    cursor.execute(INSERT_SESSION_SQL, (
+                        email, ip_address, data_usage,
+                        device_info, location, connection_type,
+                        email
+                    ))
+                    inserted = cursor.rowcount
+                except IntegrityError:
+                    inserted = 0
+                
+                # No users row (or the FK rejected the session)
+                if not inserted:
                     logger.warning(f"Attempted to record session for non-existent user: {email}")
                     raise ValidationError("User does not exist")
                 
-                # Record session
-                cursor.execute('''
-                    INSERT INTO user_sessions (
-                        email, ip_address, connected_at, data_usage,
-                        device_info, location, connection_type
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ''', (
-                    email, ip_address, current_time, data_usage,
-                    device_info, location, connection_type
-                ))
-                
-                # Update user's total usage
-                cursor.execute('''
-                    UPDATE users 
-                    SET total_usage = total_usage + %s,
-                        last_modified = %s
-                    WHERE email = %s
-                ''', (data_usage, current_time, email))
-                
-                conn.commit()
+                self.invalidate_user(email=email)
                 logger.info(f"Session recorded successfully for user {email}")
                 return True
                 
         except MySQLError as e:
-            logger.error(f"Database error recording session: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Database error recording session: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to record session: {str(e)}")
         except Exception as e:
-            logger.error(f"Error recording session: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error recording session: {str(e)}", exc_info=True)
             raise
 
-    def get_user_activity(self, user_id: int, limit: int = 10) -> List[Dict]:
-        """Get user activity history with proper error handling"""
+    def record_sessions_bulk(self, rows: List[Dict]) -> int:
+        """Record many sessions with multi-row INSERTs
+
+        Each row takes the record_session arguments as keys. Sessions for
+        unknown users are skipped. Returns the number of sessions recorded.
+        """
+        try:
+            for row in rows:
+                email = row.get('email')
+                if not email or not isinstance(email, str):
+                    raise ValidationError(f"Invalid email: {email}")
+                if not row.get('ip_address') or not isinstance(row['ip_address'], str):
+                    raise ValidationError(f"Invalid IP address for {email}")
+                if row.get('data_usage', 0) < 0:
+                    raise ValidationError(f"Data usage cannot be negative for {email}")
+            if not rows:
+                return 0
+            
+            current_time = datetime.now()
+            emails = list({row['email'] for row in rows})
+            inserted = 0
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                # One lookup for the whole batch replaces the per-row INSERT ... SELECT
+                cursor.execute(
+                    f"SELECT email FROM users WHERE email IN ({', '.join(['%s'] * len(emails))})",
+                    emails
+                )
+                known = {email for (email,) in cursor.fetchall()}
+                params_list = [
+                    (
+                        row['email'], row['ip_address'], current_time, row.get('data_usage', 0),
+                        row.get('device_info'), row.get('location'), row.get('connection_type')
+                    )
+                    for row in rows
+                    if row['email'] in known
+                ]
+                conn.start_transaction()
+                for start in range(0, len(params_list), BULK_CHUNK_SIZE):
+                    cursor.executemany("""
+                        INSERT INTO user_sessions (
+                            email, ip_address, connected_at, data_usage,
+                            device_info, location, connection_type
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """, params_list[start:start + BULK_CHUNK_SIZE])
+                    inserted += cursor.rowcount
+                conn.commit()
+            
+            for email in known:
+                self.invalidate_user(email=email)
+            if inserted < len(rows):
+                logger.warning(f"Skipped {len(rows) - inserted} sessions for non-existent users")
+            logger.info(f"Bulk-recorded {inserted} sessions")
+            return inserted
+                
+        except MySQLError as e:
+            logger.error(f"Database error bulk-recording sessions: {str(e)}", exc_info=True)
+            raise DatabaseError(f"Failed to record sessions: {str(e)}")
+
+    def get_user_activity(self, user_id: int, limit: int = 10, raw: bool = False) -> List[Dict]:
+        """Get user activity history with proper error handling
+
+        With ``raw=True`` each row's ``details`` is the stored JSON text,
+        for callers that only pass it on.
+        """
         try:
             # Validate input parameters
             if not isinstance(user_id, int) or user_id <= 0:
@@ -599,40 +1337,51 @@ class Database:
                 raise ValidationError("Invalid limit")
             
             with self.get_connection() as conn:
-                cursor = conn.cursor()
+                cursor = self._prepared(conn, USER_ACTIVITY_SQL, dictionary=True)
                 
-                cursor.execute('''
-                    SELECT 
-                        activity_type,
-                        timestamp,
-                        details,
-                        ip_address
-                    FROM user_activity
-                    WHERE user_id = %s
-                    ORDER BY timestamp DESC
-                    LIMIT %s
-                ''', (user_id, min(limit, 100)))  # Cap at 100 records
-                
-                activities = []
-                for row in cursor.fetchall():
-                    activity = {
-                        'type': row[0],
-                        'timestamp': row[1],
-                        'details': json.loads(row[2]) if row[2] else None,
-                        'ip_address': row[3]
-                    }
-                    activities.append(activity)
+                cursor.execute(USER_ACTIVITY_SQL, (user_id, min(limit, 100)))  # Cap at 100 records
+                activities = cursor.fetchall()
+                if not raw:
+                    for activity in activities:
+                        activity['details'] = orjson.loads(activity['details']) if activity['details'] else None
                 
                 logger.debug(f"Retrieved {len(activities)} activities for user {user_id}")
                 return activities
                 
         except MySQLError as e:
-            logger.error(f"Database error getting user activity: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Database error getting user activity: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to get user activity: {str(e)}")
         except Exception as e:
-            logger.error(f"Error getting user activity: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error getting user activity: {str(e)}", exc_info=True)
             raise
 
+    def iter_user_activity(self, user_id: int, limit: int = 1000, raw: bool = False) -> Iterator[Dict]:
+        """Stream user activity rows, newest first, without buffering them
+
+        Unlike get_user_activity the limit isn't capped. The pooled
+        connection is held until the generator is exhausted or closed,
+        so consume it promptly.
+        """
+        if not isinstance(user_id, int) or user_id <= 0:
+            raise ValidationError("Invalid user ID")
+        if not isinstance(limit, int) or limit <= 0:
+            raise ValidationError("Invalid limit")
+        
+        with self.get_connection() as conn:
+            # Plain cursors are unbuffered: rows are read off the socket as we go
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(USER_ACTIVITY_SQL, (user_id, limit))
+            try:
+                for activity in cursor:
+                    if not raw:
+                        activity['details'] = orjson.loads(activity['details']) if activity['details'] else None
+                    yield activity
+            finally:
+                # Stopped early: read off the rest so the connection goes back clean
+                if conn.unread_result:
+                    cursor.fetchall()
+                cursor.close()
+
     def get_user_stats(self, email: str) -> Dict:
         """Get comprehensive user statistics with proper error handling"""
         try:
@@ -640,77 +1389,50 @@ class Database:
             if not email or not isinstance(email, str):
                 raise ValidationError("Invalid email")
             
+            with self._user_cache_lock:
+                cached = self._user_cache.get(('stats', email))
+            if cached is not None:
+                return dict(cached)
+            
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Get user basic info
-                cursor.execute("""
-                    SELECT 
-                        traffic_limit,
-                        total_usage,
-                        status,
-                        expiry_date,
-                        created_at
-                    FROM users 
-                    WHERE email = %s
-                """, (email,))
+                cursor = self._prepared(conn, USER_STATS_SQL, dictionary=True)
                 
-                user_row = cursor.fetchone()
-                if not user_row:
+                cursor.execute(USER_STATS_SQL, (email, email))
+                rows = cursor.fetchall()
+                row = rows[0] if rows else None
+                if not row:
                     logger.warning(f"Attempted to get stats for non-existent user: {email}")
                     raise ValidationError("User does not exist")
                 
-                traffic_limit, total_usage, status, expiry_date, created_at = user_row
-                
-                # Get session statistics
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total_sessions,
-                        SUM(data_usage) as session_usage,
-                        MAX(connected_at) as last_connection,
-                        COUNT(DISTINCT ip_address) as unique_ips,
-                        COUNT(DISTINCT device_info) as unique_devices
-                    FROM user_sessions 
-                    WHERE email = %s
-                """, (email,))
-                
-                session_row = cursor.fetchone()
-                total_sessions, session_usage, last_connection, unique_ips, unique_devices = session_row
-                
-                # Get recent locations
-                cursor.execute("""
-                    SELECT DISTINCT location 
-                    FROM user_sessions 
-                    WHERE email = %s AND location IS NOT NULL 
-                    ORDER BY connected_at DESC 
-                    LIMIT 5
-                """, (email,))
-                
-                recent_locations = [row[0] for row in cursor.fetchall()]
+                traffic_limit = row['traffic_limit']
+                total_usage = int(row['session_usage'])
+                recent_locations = orjson.loads(row['recent_locations']) if row['recent_locations'] else []
                 
                 stats = {
                     'traffic_limit': traffic_limit * 1024**3,  # Convert to bytes
                     'total_usage': total_usage,
                     'usage_percentage': (total_usage / (traffic_limit * 1024**3) * 100) if traffic_limit > 0 else 0,
-                    'status': status,
-                    'expiry_date': expiry_date,
-                    'account_age_days': (datetime.now() - datetime.fromisoformat(created_at)).days,
-                    'total_sessions': total_sessions,
-                    'session_usage': session_usage or 0,
-                    'last_connection': last_connection,
-                    'unique_ips': unique_ips,
-                    'unique_devices': unique_devices,
+                    'status': row['status'],
+                    'expiry_date': row['expiry_date'],
+                    'account_age_days': (datetime.now() - row['created_at']).days,
+                    'total_sessions': row['total_sessions'],
+                    'session_usage': total_usage,
+                    'last_connection': row['last_connection'],
+                    'unique_ips': row['unique_ips'],
+                    'unique_devices': row['unique_devices'],
                     'recent_locations': recent_locations
                 }
                 
+                with self._user_cache_lock:
+                    self._user_cache[('stats', email)] = stats
                 logger.debug(f"Retrieved comprehensive stats for user {email}")
-                return stats
+                return dict(stats)
                 
         except MySQLError as e:
-            logger.error(f"Database error getting user stats: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Database error getting user stats: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to get user statistics: {str(e)}")
         except Exception as e:
-            logger.error(f"Error getting user stats: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error getting user stats: {str(e)}", exc_info=True)
             raise
 
     def get_user_messages(self, user_id: int, since_timestamp: float) -> List[Dict]:
@@ -723,213 +1445,170 @@ class Database:
                 raise ValidationError("Invalid timestamp")
             
             with self.get_connection() as conn:
-                cursor = conn.cursor()
+                cursor = self._prepared(conn, USER_MESSAGES_SQL, dictionary=True)
                 
                 # Get messages within the time window
-                cursor.execute('''
-                    SELECT timestamp, message, details
-                    FROM logs
-                    WHERE user_id = %s 
-                    AND event_type = 'message_received'
-                    AND timestamp >= FROM_UNIXTIME(%s)
-                    ORDER BY timestamp DESC
-                ''', (user_id, since_timestamp))
-                
-                messages = []
-                for row in cursor.fetchall():
-                    message = {
-                        'timestamp': row[0],
-                        'message': row[1],
-                        'details': json.loads(row[2]) if row[2] else None
-                    }
-                    messages.append(message)
+                cursor.execute(USER_MESSAGES_SQL, (user_id, datetime.fromtimestamp(since_timestamp)))
+                messages = cursor.fetchall()
+                for message in messages:
+                    message['details'] = orjson.loads(message['details']) if message['details'] else None
                 
                 logger.debug(f"Retrieved {len(messages)} messages for user {user_id}")
                 return messages
                 
-        except MySQLError as e:
-            logger.error(f"Error getting user messages: {str(e)}\n{traceback.format_exc()}")
-            raise DatabaseError(f"Failed to get user messages: {str(e)}")
         except Exception as e:
-            logger.error(f"Error getting user messages: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error getting user messages: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to get user messages: {str(e)}")
 
     def close(self):
         """Clean up database resources"""
         try:
             logger.info("Cleaning up database resources")
-            # Any cleanup code here if needed
+            log_thread = getattr(self, '_log_thread', None)
+            if log_thread is not None and log_thread.is_alive():
+                # Let the writer finish the batch it's holding, then drain the rest here
+                try:
+                    self._log_q.put(None, timeout=1)
+                    log_thread.join(timeout=5)
+                except queue.Full:
+                    pass
+            self.flush_logs()
         except Exception as e:
-            logger.error(f"Error during database cleanup: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error during database cleanup: {str(e)}", exc_info=True)
             # Don't raise here as this is cleanup code
 
     def ensure_user_exists(self, user_data: Dict) -> bool:
         """Ensure user exists in both users and telegram_users tables"""
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                current_time = datetime.now().isoformat()
-                
-                # Check if user exists
-                cursor.execute("""
-                    SELECT telegram_id FROM telegram_users 
-                    WHERE telegram_id = %s
-                """, (user_data['id'],))
-                
-                existing_user = cursor.fetchone()
-                
-                if existing_user:
-                    # Update existing user
-                    cursor.execute("""
-                        UPDATE telegram_users 
-                        SET 
-                            username = COALESCE(%s, username),
-                            first_name = COALESCE(%s, first_name),
-                            last_name = COALESCE(%s, last_name),
-                            language_code = COALESCE(%s, language_code),
-                            last_activity = %s,
-                            is_admin = %s
-                        WHERE telegram_id = %s
-                    """, (
-                        user_data.get('username'),
-                        user_data.get('first_name'),
-                        user_data.get('last_name'),
-                        user_data.get('language_code', 'fa'),
-                        current_time,
-                        user_data['id'] in ADMIN_IDS,
-                        user_data['id']
-                    ))
-                else:
-                    # Insert new user
-                    cursor.execute("""
-                        INSERT INTO telegram_users (
-                            telegram_id, username, first_name, last_name,
-                            language_code, created_at, last_activity, is_admin
-                        ) VALUES (
-                            %s, %s, %s, %s, %s, %s, %s, %s
-                        )
-                    """, (
-                        user_data['id'],
-                        user_data.get('username', ''),
-                        user_data.get('first_name', ''),
-                        user_data.get('last_name', ''),
-                        user_data.get('language_code', 'fa'),
-                        current_time,
-                        current_time,
-                        user_data['id'] in ADMIN_IDS
-                    ))
-                
-                # Also ensure user exists in users table
-                cursor.execute("""
-                    SELECT telegram_id FROM users WHERE telegram_id = %s
-                """, (user_data['id'],))
-                
-                if not cursor.fetchone():
-                    cursor.execute("""
-                        INSERT INTO users (
-                            telegram_id, username, first_name, last_name,
-                            language_code, created_at, last_activity, status,
-                            traffic_limit, total_usage
-                        ) VALUES (
-                            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                        )
-                    """, (
-                        user_data['id'],
-                        user_data.get('username', ''),
-                        user_data.get('first_name', ''),
-                        user_data.get('last_name', ''),
-                        user_data.get('language_code', 'fa'),
-                        current_time,
-                        current_time,
-                        'active',  # Default status
-                        0,  # Default traffic limit
-                        0   # Default usage
-                    ))
-                
-                conn.commit()
-                logger.info(f"User data {'updated' if existing_user else 'created'} for user {user_data['id']}")
+                cursor = self._cursor(conn)
+                telegram_id = user_data['id']
+                username = user_data.get('username')
+                first_name = user_data.get('first_name')
+                last_name = user_data.get('last_name')
+                language_code = user_data.get('language_code', 'fa')
+                
+                # Upsert telegram_users and make sure a users row exists, in one
+                # round-trip; the users upsert is a no-op for existing rows
+                results = cursor.execute("""
+                    INSERT INTO telegram_users (
+                        telegram_id, username, first_name, last_name,
+                        language_code, created_at, last_activity, is_admin
+                    ) VALUES (
+                        %s, COALESCE(%s, ''), COALESCE(%s, ''), COALESCE(%s, ''),
+                        %s, NOW(), NOW(), %s
+                    )
+                    ON DUPLICATE KEY UPDATE
+                        username = COALESCE(%s, username),
+                        first_name = COALESCE(%s, first_name),
+                        last_name = COALESCE(%s, last_name),
+                        language_code = COALESCE(%s, language_code),
+                        last_activity = VALUES(last_activity),
+                        is_admin = VALUES(is_admin);
+                    INSERT INTO users (
+                        telegram_id, username, first_name, last_name,
+                        language_code, last_activity, status,
+                        traffic_limit, total_usage
+                    ) VALUES (
+                        %s, COALESCE(%s, ''), COALESCE(%s, ''), COALESCE(%s, ''),
+                        %s, NOW(), 'active', 0, 0
+                    )
+                    ON DUPLICATE KEY UPDATE telegram_id = telegram_id
+                """, (
+                    telegram_id, username, first_name, last_name,
+                    language_code, telegram_id in _ADMIN_ID_SET,
+                    username, first_name, last_name, language_code,
+                    telegram_id, username, first_name, last_name,
+                    language_code
+                ), multi=True)
+                # Upsert rowcount: 1 = inserted, 2 = updated, 0 = unchanged
+                telegram_rowcount, users_rowcount = [result.rowcount for result in results]
+                existing_user = telegram_rowcount != 1
+                
+                # Only a new users row can make a cached miss stale
+                if users_rowcount == 1:
+                    self.invalidate_user(telegram_id=telegram_id)
+                logger.info(f"User data {'updated' if existing_user else 'created'} for user {telegram_id}")
                 return True
                 
         except MySQLError as e:
             error_msg = str(e)
-            logger.error(f"Database error in ensure_user_exists: {error_msg}\n{traceback.format_exc()}")
+            logger.error(f"Database error in ensure_user_exists: {error_msg}", exc_info=True)
             if "Unknown column" in error_msg:
                 logger.error("Database schema mismatch. Please check table structure.")
             return False
         except Exception as e:
-            logger.error(f"Unexpected error in ensure_user_exists: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Unexpected error in ensure_user_exists: {str(e)}", exc_info=True)
             return False
 
     def log_bot_activity(self, user_id: int, command: str, input_data: dict = None, 
                         output_data: dict = None, process_details: dict = None, 
                         status: str = 'success', error: str = None) -> bool:
-        """Log comprehensive bot activity including input, process, and output"""
+        """Log comprehensive bot activity including input, process, and output
+
+        Rows are queued for the background log writer; returns False if
+        the queue was full.
+        """
+        if not (LOG_ACTIVITY or error or logger.logger.isEnabledFor(logging.DEBUG)):
+            return True
         try:
-            current_time = datetime.now().isoformat()
+            current_time = datetime.now()
             
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Get user info for context
-                cursor.execute("""
-                    SELECT username, first_name, last_name, email 
-                    FROM users 
-                    WHERE telegram_id = %s
-                """, (user_id,))
-                user_info = cursor.fetchone()
-                
-                # Prepare activity details
-                details = {
-                    'timestamp': current_time,
-                    'user_info': {
-                        'telegram_id': user_id,
-                        'username': user_info[0] if user_info else None,
-                        'first_name': user_info[1] if user_info else None,
-                        'last_name': user_info[2] if user_info else None,
-                        'email': user_info[3] if user_info else None
-                    },
-                    'command': command,
-                    'input': input_data,
-                    'process': process_details,
-                    'output': output_data,
-                    'status': status,
-                    'error': error
-                }
-                
-                # Log to activity table
-                cursor.execute("""
-                    INSERT INTO user_activity (
-                        user_id, activity_type, timestamp, details
-                    ) VALUES (%s, %s, %s, %s)
-                """, (
+            if COMPACT_ACTIVITY and not error and not logger.logger.isEnabledFor(logging.DEBUG):
+                return self._enqueue_log('user_activity', (
                     user_id,
                     f'command_{command}',
                     current_time,
-                    json.dumps(details, cls=DateTimeEncoder)
+                    _json_dumps({'command': command, 'status': status, 'timestamp': current_time})
                 ))
-                
-                # If error occurred, also log to logs table
-                if error:
-                    cursor.execute("""
-                        INSERT INTO logs (
-                            timestamp, level, event_type, user_id, 
-                            message, details
-                        ) VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (
-                        current_time,
-                        'ERROR',
-                        f'command_error_{command}',
-                        user_id,
-                        error,
-                        json.dumps(details, cls=DateTimeEncoder)
-                    ))
-                
-                conn.commit()
-                logger.debug(f"Activity logged for user {user_id}, command: {command}")
-                return True
+            
+            # Get user info for context
+            user_info = self._get_user_context(user_id)
+            
+            # Prepare activity details
+            details = {
+                'timestamp': current_time,
+                'user_info': {
+                    'telegram_id': user_id,
+                    'username': user_info[0] if user_info else None,
+                    'first_name': user_info[1] if user_info else None,
+                    'last_name': user_info[2] if user_info else None,
+                    'email': user_info[3] if user_info else None
+                },
+                'command': command,
+                'input': input_data,
+                'process': process_details,
+                'output': output_data,
+                'status': status,
+                'error': error
+            }
+            details_blob = _json_dumps(details)
+            
+            # Log to activity table
+            queued = self._enqueue_log('user_activity', (
+                user_id,
+                f'command_{command}',
+                current_time,
+                details_blob
+            ))
+            
+            # If error occurred, also log to logs table; queued with the
+            # activity row so both land in the same writer batch
+            if error:
+                queued = self._enqueue_log('command_errors', (
+                    current_time,
+                    'ERROR',
+                    f'command_error_{command}',
+                    user_id,
+                    error,
+                    details_blob
+                )) and queued
+            
+            logger.debug(f"Activity logged for user {user_id}, command: {command}")
+            return queued
                 
         except Exception as e:
-            logger.error(f"Error logging bot activity: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error logging bot activity: {str(e)}", exc_info=True)
             return False
 
     def get_all_users(self, limit: int = 100, offset: int = 0) -> List[Dict]:
@@ -937,19 +1616,27 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor(dictionary=True)
+                # total_usage is derived from user_sessions, not the stored column
                 cursor.execute("""
-                    SELECT * FROM users
-                    ORDER BY id DESC
+                    SELECT
+                        u.*,
+                        COALESCE((
+                            SELECT SUM(s.data_usage)
+                            FROM user_sessions s
+                            WHERE s.email = u.email
+                        ), 0) AS total_usage
+                    FROM users u
+                    ORDER BY u.id DESC
                     LIMIT %s OFFSET %s
                 """, (limit, offset))
                 
                 users = cursor.fetchall()
                 return users if users else []
         except MySQLError as e:
-            logger.error(f"Database error getting all users: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Database error getting all users: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to get all users: {str(e)}")
         except Exception as e:
-            logger.error(f"Error getting all users: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error getting all users: {str(e)}", exc_info=True)
             return []
 
     def count_users(self) -> int:
@@ -961,108 +1648,80 @@ class Database:
                 result = cursor.fetchone()
                 return result[0] if result else 0
         except MySQLError as e:
-            logger.error(f"Database error counting users: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Database error counting users: {str(e)}", exc_info=True)
             raise DatabaseError(f"Failed to count users: {str(e)}")
         except Exception as e:
-            logger.error(f"Error counting users: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error counting users: {str(e)}", exc_info=True)
             return 0
 
     def log_chat_message(self, user_id: int, message_id: int, chat_id: int, message_type: str, 
                         content: str, reply_to_message_id: int = None, forward_from_id: int = None,
                         is_command: bool = False, command_name: str = None, command_args: str = None,
                         bot_response: str = None, response_time: int = None) -> bool:
-        """Log detailed chat message information"""
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO chat_history (
-                        user_id, message_id, chat_id, message_type, content,
-                        reply_to_message_id, forward_from_id, is_command,
-                        command_name, command_args, bot_response, response_time
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    user_id, message_id, chat_id, message_type, content,
-                    reply_to_message_id, forward_from_id, is_command,
-                    command_name, command_args, bot_response, response_time
-                ))
-                conn.commit()
-                return True
-        except Exception as e:
-            logger.error(f"Error logging chat message: {str(e)}")
-            return False
+        """Queue a chat_history row for the background log writer
+
+        Bursts of messages are written with one multi-row INSERT; returns
+        False if the queue was full.
+        """
+        return self._enqueue_log('chat_history', (
+            user_id, message_id, chat_id, message_type, content,
+            reply_to_message_id, forward_from_id, is_command,
+            command_name, command_args, bot_response, response_time
+        ))
 
     def log_shared_link(self, user_id: int, link_type: str, link_url: str, title: str = None,
                        description: str = None, message_id: int = None, chat_id: int = None,
                        expiry_date: datetime = None) -> bool:
-        """Log shared link information"""
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO shared_links (
-                        user_id, link_type, link_url, title, description,
-                        message_id, chat_id, expiry_date
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    user_id, link_type, link_url, title, description,
-                    message_id, chat_id, expiry_date
-                ))
-                conn.commit()
-                return True
-        except Exception as e:
-            logger.error(f"Error logging shared link: {str(e)}")
-            return False
+        """Queue a shared_links row for the background log writer"""
+        return self._enqueue_log('shared_links', (
+            user_id, link_type, link_url, title, description,
+            message_id, chat_id, expiry_date
+        ))
 
     def log_bot_command(self, command_name: str, user_id: int, args: str = None,
                        result: str = None, execution_time: int = None, status: str = 'success',
                        error_message: str = None, session_id: str = None) -> bool:
         """Log bot command execution with detailed information"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Prepare command metadata
-                command_metadata = {
-                    'args': args,
-                    'result': result,
-                    'error_message': error_message,
-                    'session_id': session_id
-                }
-                
-                # Prepare performance metrics
-                performance_metrics = {
-                    'execution_time': execution_time,
-                    'status': status,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                # Prepare user context
-                user_context = self.get_user_info(user_id, by_telegram=True)
-                
-                cursor.execute("""
-                    INSERT INTO bot_commands (
-                        command_name, user_id, args, result, execution_time,
-                        status, error_message, session_id, command_metadata,
-                        performance_metrics, user_context, timestamp
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-                """, (
-                    command_name,
-                    user_id,
-                    args,
-                    result,
-                    execution_time,
-                    status,
-                    error_message,
-                    session_id,
-                    json.dumps(command_metadata, cls=DateTimeEncoder),
-                    json.dumps(performance_metrics, cls=DateTimeEncoder),
-                    json.dumps(user_context, cls=DateTimeEncoder) if user_context else None
-                ))
-                
-                conn.commit()
-                logger.debug(f"Command logged successfully: {command_name}")
-                return True
+            # Prepare command metadata
+            command_metadata = {
+                'args': args,
+                'result': result,
+                'error_message': error_message,
+                'session_id': session_id
+            }
+            
+            # Prepare performance metrics
+            performance_metrics = {
+                'execution_time': execution_time,
+                'status': status,
+                'timestamp': datetime.now()
+            }
+            
+            # Prepare user context
+            user_context = self.get_user_info(user_id, by_telegram=True)
+            
+            command_metadata_json = _json_dumps(command_metadata)
+            performance_metrics_json = _json_dumps(performance_metrics)
+            user_context_json = _json_dumps(user_context) if user_context else None
+            
+            # Stamped now: the row is written after a short delay
+            queued = self._enqueue_log('bot_commands', (
+                command_name,
+                user_id,
+                args,
+                result,
+                execution_time,
+                status,
+                error_message,
+                session_id,
+                command_metadata_json,
+                performance_metrics_json,
+                user_context_json,
+                performance_metrics['timestamp']
+            ))
+            logger.debug(f"Command queued for logging: {command_name}")
+            return queued
                 
         except Exception as e:
             logger.error(f"Error logging command: {str(e)}")
@@ -1071,17 +1730,8 @@ class Database:
     def log_system_metric(self, metric_type: str, metric_value: float, details: dict = None) -> bool:
         """Log system performance metrics"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO system_metrics (
-                        metric_type, metric_value, details
-                    ) VALUES (%s, %s, %s)
-                """, (
-                    metric_type, metric_value, json.dumps(details) if details else None
-                ))
-                conn.commit()
-                return True
+            details_json = _json_dumps(details) if details else None
+            return self._enqueue_log('system_metrics', (metric_type, metric_value, details_json))
         except Exception as e:
             logger.error(f"Error logging system metric: {str(e)}")
             return False
@@ -1091,17 +1741,9 @@ class Database:
         """Update user statistics"""
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE users 
-                    SET total_messages = total_messages + %s,
-                        total_commands = total_commands + %s,
-                        total_links = total_links + %s,
-                        total_sessions = total_sessions + %s,
-                        last_activity = CURRENT_TIMESTAMP
-                    WHERE telegram_id = %s
-                """, (message_count, command_count, link_count, session_count, user_id))
-                conn.commit()
+                cursor = self._prepared(conn, UPDATE_USER_STATS_SQL)
+                cursor.execute(UPDATE_USER_STATS_SQL, (message_count, command_count, link_count, session_count, user_id))
+                self.invalidate_user(telegram_id=user_id)
                 return True
         except Exception as e:
             logger.error(f"Error updating user stats: {str(e)}")
@@ -1113,45 +1755,17 @@ class Database:
             with self.get_connection() as conn:
                 cursor = conn.cursor(dictionary=True)
                 
-                # Get message count
-                cursor.execute("""
-                    SELECT COUNT(*) as message_count 
-                    FROM chat_history 
-                    WHERE user_id = %s 
-                    AND created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-                """, (user_id, days))
-                message_stats = cursor.fetchone()
-                
-                # Get command usage
-                cursor.execute("""
-                    SELECT command_name, COUNT(*) as usage_count 
-                    FROM bot_commands 
-                    WHERE user_id = %s 
-                    AND timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
-                    GROUP BY command_name
-                """, (user_id, days))
-                command_stats = cursor.fetchall()
-                
-                # Get link sharing stats
-                cursor.execute("""
-                    SELECT link_type, COUNT(*) as share_count 
-                    FROM shared_links 
-                    WHERE user_id = %s 
-                    AND shared_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-                    GROUP BY link_type
-                """, (user_id, days))
-                link_stats = cursor.fetchall()
-                
-                # Get session stats
-                cursor.execute("""
-                    SELECT COUNT(*) as session_count,
-                           SUM(data_usage) as total_data_usage,
-                           AVG(duration) as avg_session_duration
-                    FROM user_sessions 
-                    WHERE user_id = %s 
-                    AND connected_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-                """, (user_id, days))
-                session_stats = cursor.fetchone()
+                # Messages, commands, links and sessions in one round-trip;
+                # each statement takes (user_id, days)
+                message_rows, command_stats, link_stats, session_rows = [
+                    result.fetchall()
+                    for result in cursor.execute(
+                        ACTIVITY_SUMMARY_SQL, (user_id, days) * 4, multi=True
+                    )
+                    if result.with_rows
+                ]
+                message_stats = message_rows[0] if message_rows else None
+                session_stats = session_rows[0] if session_rows else None
                 
                 return {
                     'message_stats': message_stats,
@@ -1193,13 +1807,18 @@ class Database:
             return []
 
     def get_bot_status(self) -> bool:
-        """Get current bot status"""
+        """Get current bot status, re-reading it at most every BOT_STATUS_TTL seconds"""
+        now = time.monotonic()
+        if self._bot_status is not None and now - self._bot_status_checked < BOT_STATUS_TTL:
+            return self._bot_status
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT is_enabled FROM bot_status ORDER BY id DESC LIMIT 1")
                 result = cursor.fetchone()
-                return bool(result[0]) if result else True
+                self._bot_status = bool(result[0]) if result else True
+                self._bot_status_checked = now
+                return self._bot_status
         except Exception as e:
             logger.error(f"Error getting bot status: {str(e)}")
             return True  # Default to enabled if error occurs
@@ -1213,7 +1832,8 @@ class Database:
                     INSERT INTO bot_status (is_enabled, updated_by, reason)
                     VALUES (%s, %s, %s)
                 """, (is_enabled, admin_id, reason))
-                conn.commit()
+                self._bot_status = bool(is_enabled)
+                self._bot_status_checked = time.monotonic()
                 return True
         except Exception as e:
             logger.error(f"Error setting bot status: {str(e)}")
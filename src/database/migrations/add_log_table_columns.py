@@ -0,0 +1,58 @@
+import logging
+from src.database.db import Database
+
+logger = logging.getLogger(__name__)
+
+# bot_commands columns written by Database.log_bot_command
+BOT_COMMAND_COLUMNS = {
+    'command_metadata': 'JSON',
+    'performance_metrics': 'JSON',
+    'user_context': 'JSON',
+}
+
+def migrate(db: Database):
+    """Create system_metrics and add the JSON columns bot_commands rows carry"""
+    try:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+
+            # Create system_metrics if it doesn't exist
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS system_metrics (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    metric_type VARCHAR(50),
+                    metric_value DOUBLE,
+                    details JSON,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_system_metrics_type_time (metric_type, timestamp)
+                )
+            """)
+
+            # Check if bot_commands table exists
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM information_schema.tables
+                WHERE table_schema = DATABASE()
+                AND table_name = 'bot_commands'
+            """)
+            if cursor.fetchone()[0] == 0:
+                logger.info("bot_commands table doesn't exist yet, skipping column addition")
+                return
+
+            for column, column_type in BOT_COMMAND_COLUMNS.items():
+                # Add the column if it doesn't exist
+                cursor.execute("""
+                    SELECT COUNT(*)
+                    FROM INFORMATION_SCHEMA.COLUMNS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                    AND TABLE_NAME = 'bot_commands'
+                    AND COLUMN_NAME = %s
+                """, (column,))
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(f"ALTER TABLE bot_commands ADD COLUMN {column} {column_type}")
+                    logger.info(f"Added {column} column to bot_commands table")
+            conn.commit()
+            logger.info("Migration add_log_table_columns completed successfully")
+    except Exception as e:
+        logger.error(f"Error in migration add_log_table_columns: {str(e)}")
+        raise
@@ -0,0 +1,42 @@
+import logging
+from src.database.db import Database
+
+logger = logging.getLogger(__name__)
+
+def migrate(db: Database):
+    """Index user_sessions by (email, connected_at) for the per-user session queries"""
+    try:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+
+            # Only sessions tables keyed by email can use this index
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'user_sessions'
+                AND COLUMN_NAME IN ('email', 'connected_at')
+            """)
+            if cursor.fetchone()[0] < 2:
+                logger.info("user_sessions has no email/connected_at columns, skipping index creation")
+                return
+
+            # Add the index if it doesn't exist
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'user_sessions'
+                AND INDEX_NAME = 'idx_user_sessions_email'
+            """)
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("""
+                    CREATE INDEX idx_user_sessions_email
+                    ON user_sessions (email, connected_at)
+                """)
+                conn.commit()
+                logger.info("Added idx_user_sessions_email index to user_sessions table")
+                logger.info("Migration add_user_sessions_email_index completed successfully")
+    except Exception as e:
+        logger.error(f"Error in migration add_user_sessions_email_index: {str(e)}")
+        raise
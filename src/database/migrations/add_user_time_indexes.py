@@ -0,0 +1,48 @@
+import logging
+from src.database.db import Database
+
+logger = logging.getLogger(__name__)
+
+# table -> (index, columns) serving the per-user time range scans in Database
+INDEXES = {
+    'logs': ('idx_logs_user_event_time', 'user_id, event_type, timestamp'),
+    'user_activity': ('idx_user_activity_user_time', 'user_id, timestamp'),
+    'chat_history': ('idx_chat_history_user_time', 'user_id, timestamp'),
+    'bot_commands': ('idx_bot_commands_user_time', 'user_id, timestamp'),
+}
+
+def migrate(db: Database):
+    """Add per-user time indexes to the per-user history tables"""
+    try:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+
+            for table, (index, columns) in INDEXES.items():
+                # Check if table exists
+                cursor.execute("""
+                    SELECT COUNT(*)
+                    FROM information_schema.tables
+                    WHERE table_schema = DATABASE()
+                    AND table_name = %s
+                """, (table,))
+                if cursor.fetchone()[0] == 0:
+                    logger.info(f"{table} table doesn't exist yet, skipping {index}")
+                    continue
+
+                # Add the index if it doesn't exist
+                cursor.execute("""
+                    SELECT COUNT(*)
+                    FROM INFORMATION_SCHEMA.STATISTICS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                    AND TABLE_NAME = %s
+                    AND INDEX_NAME = %s
+                """, (table, index))
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+                    conn.commit()
+                    logger.info(f"Added {index} index to {table} table")
+
+            logger.info("Migration add_user_time_indexes completed successfully")
+    except Exception as e:
+        logger.error(f"Error in migration add_user_time_indexes: {str(e)}")
+        raise
@@ -0,0 +1,52 @@
+import logging
+from src.database.db import Database
+
+logger = logging.getLogger(__name__)
+
+def migrate(db: Database):
+    """Let MySQL fill users.created_at and users.last_modified"""
+    try:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Check if users table exists
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM information_schema.tables 
+                WHERE table_schema = DATABASE()
+                AND table_name = 'users'
+            """)
+            if cursor.fetchone()[0] == 0:
+                logger.info("users table doesn't exist yet, skipping timestamp defaults")
+                return
+
+            cursor.execute("""
+                ALTER TABLE users
+                MODIFY COLUMN created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            """)
+
+            # Add last_modified column if it doesn't exist
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'users'
+                AND COLUMN_NAME = 'last_modified'
+            """)
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("""
+                    ALTER TABLE users
+                    ADD COLUMN last_modified DATETIME
+                    DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                """)
+            else:
+                cursor.execute("""
+                    ALTER TABLE users
+                    MODIFY COLUMN last_modified DATETIME
+                    DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                """)
+            conn.commit()
+            logger.info("Migration add_user_timestamp_defaults completed successfully")
+    except Exception as e:
+        logger.error(f"Error in migration add_user_timestamp_defaults: {str(e)}")
+        raise
@@ -5,6 +5,10 @@ from src.database.migrations.add_response_columns import migrate as add_response
 from src.database.migrations.add_stats_columns import migrate as add_stats_columns
 from src.database.migrations.add_user_activity_columns import migrate as add_user_activity_columns
 from src.database.migrations.fix_foreign_keys import migrate as fix_foreign_keys
+from src.database.migrations.add_user_sessions_email_index import migrate as add_user_sessions_email_index
+from src.database.migrations.add_user_time_indexes import migrate as add_user_time_indexes
+from src.database.migrations.add_user_timestamp_defaults import migrate as add_user_timestamp_defaults
+from src.database.migrations.add_log_table_columns import migrate as add_log_table_columns
 from src.database.db import Database
 import logging
 import importlib
@@ -30,7 +34,11 @@ def run_migrations():
             add_response_columns,
             add_stats_columns,
             add_user_activity_columns,
-            fix_foreign_keys
+            fix_foreign_keys,
+            add_user_sessions_email_index,
+            add_user_time_indexes,
+            add_user_timestamp_defaults,
+            add_log_table_columns
         ]
         
         successful = 0
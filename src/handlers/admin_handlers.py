@@ -10,6 +10,8 @@ import shutil
 from pathlib import Path
 import traceback
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from itertools import batched
 from sqlalchemy.orm import Session
 import re
 import psutil
@@ -34,6 +36,9 @@ from ..utils.datetime_encoder import DateTimeEncoder
 # Initialize custom logger
 logger = CustomLogger("AdminHandler")
 
+# Broadcast messages sent concurrently per second
+BROADCAST_BATCH_SIZE = 25
+
 def handle_admin_errors(func):
     """Decorator for handling errors in admin handler methods"""
     @wraps(func)
@@ -41,7 +46,7 @@ def handle_admin_errors(func):
         try:
             return func(self, message, *args, **kwargs)
         except DatabaseError as e:
-            logger.error(f"Database Error in {func.__name__}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Database Error in {func.__name__}: {str(e)}", exc_info=True)
             self.bot.reply_to(
                 message,
                 "❌ خطا در پایگاه داده\\. لطفاً با تیم پشتیبانی تماس بگیرید\\.",
@@ -55,14 +60,14 @@ def handle_admin_errors(func):
                 parse_mode='MarkdownV2'
             )
         except APIError as e:
-            logger.error(f"API Error in {func.__name__}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"API Error in {func.__name__}: {str(e)}", exc_info=True)
             self.bot.reply_to(
                 message,
                 "❌ خطا در ارتباط با پنل\\. لطفاً بعداً تلاش کنید\\.",
                 parse_mode='MarkdownV2'
             )
         except Exception as e:
-            logger.error(f"Unexpected error in {func.__name__}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Unexpected error in {func.__name__}: {str(e)}", exc_info=True)
             self.bot.reply_to(
                 message,
                 "❌ خطای غیرمنتظره\\. لطفاً با تیم پشتیبانی تماس بگیرید\\.",
@@ -248,7 +253,7 @@ class AdminHandler:
             logger.info(f"Online users list sent to admin {message.from_user.id}")
             
         except Exception as e:
-            logger.error(f"Error fetching online users: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error fetching online users: {str(e)}", exc_info=True)
             raise APIError("Failed to fetch online users")
 
     @admin_required
@@ -353,7 +358,7 @@ class AdminHandler:
             logger.info(f"Log file sent to admin {message.from_user.id}")
             
         except Exception as e:
-            logger.error(f"Error handling logs: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling logs: {str(e)}", exc_info=True)
             raise DatabaseError("Failed to generate log file")
 
     def _cleanup_old_exports(self, export_dir: Path, keep_days: int = 3):
@@ -639,23 +644,21 @@ class AdminHandler:
                 parse_mode='MarkdownV2'
             )
 
-            # Send message to users
+            # Send message to users, BROADCAST_BATCH_SIZE at a time and at most
+            # one batch per second to stay under Telegram's 30 msg/s limit
             success_count = 0
-            fail_count = 0
-            for i, user in enumerate(users, 1):
-                try:
-                    self.bot.send_message(
-                        user.telegram_id,
-                        broadcast_text,
-                        parse_mode='MarkdownV2'
+            sent = 0
+            with ThreadPoolExecutor(max_workers=BROADCAST_BATCH_SIZE) as executor:
+                for batch in batched(users, BROADCAST_BATCH_SIZE):
+                    batch_start = time.monotonic()
+                    results = executor.map(
+                        lambda u: self._send_broadcast(u.telegram_id, broadcast_text),
+                        batch
                     )
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Error sending broadcast to user {user.telegram_id}: {str(e)}")
-                    fail_count += 1
+                    success_count += sum(results)
+                    sent += len(batch)
 
-                # Update status every 10 users or at the end
-                if i % 10 == 0 or i == total_users:
+                    # Update status after each batch
                     try:
                         self.bot.edit_message_text(
                             f"""
@@ -667,9 +670,9 @@ class AdminHandler:
 • وضعیت: {format_code('در حال ارسال')}
 
 ⏳ {format_bold('پیشرفت')}:
-• ارسال شده: {format_code(str(i))}
-• باقیمانده: {format_code(str(total_users - i))}
-• درصد: {format_code(f'{int(i/total_users*100)}%')}
+• ارسال شده: {format_code(str(sent))}
+• باقیمانده: {format_code(str(total_users - sent))}
+• درصد: {format_code(f'{int(sent/total_users*100)}%')}
 """,
                             status_msg.chat.id,
                             status_msg.message_id,
@@ -678,6 +681,10 @@ class AdminHandler:
                     except Exception as e:
                         logger.error(f"Error updating status message: {str(e)}")
 
+                    if sent < total_users:
+                        time.sleep(max(0.0, 1.0 - (time.monotonic() - batch_start)))
+            fail_count = total_users - success_count
+
             # Send final status
             try:
                 self.bot.edit_message_text(
@@ -721,13 +728,22 @@ class AdminHandler:
                 )
 
         except Exception as e:
-            logger.error(f"Unexpected error in handle_broadcast: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Unexpected error in handle_broadcast: {str(e)}", exc_info=True)
             self.bot.reply_to(
                 message,
                 "❌ خطا در ارسال پیام همگانی\\. لطفا دوباره تلاش کنید\\.",
                 parse_mode='MarkdownV2'
             )
 
+    def _send_broadcast(self, telegram_id: int, text: str) -> bool:
+        """Send one broadcast message; True on success"""
+        try:
+            self.bot.send_message(telegram_id, text, parse_mode='MarkdownV2')
+            return True
+        except Exception as e:
+            logger.error(f"Error sending broadcast to user {telegram_id}: {str(e)}")
+            return False
+
     @admin_required
     @handle_admin_errors
     def handle_system(self, message: Message):
@@ -823,7 +839,7 @@ class AdminHandler:
             )
 
         except Exception as e:
-            logger.error(f"Error getting system info: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error getting system info: {str(e)}", exc_info=True)
             raise APIError("Failed to get system information")
 
     @admin_required
@@ -992,7 +1008,7 @@ class AdminHandler:
             self.bot.answer_callback_query(call.id)
             
         except Exception as e:
-            logger.error(f"Error showing users page {page}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error showing users page {page}: {str(e)}", exc_info=True)
             self.bot.answer_callback_query(
                 call.id,
                 "❌ خطا در نمایش صفحه. لطفاً مجدد تلاش کنید.",
@@ -1105,7 +1121,7 @@ class AdminHandler:
             logger.info(f"User list exported to {filepath}")
             
         except Exception as e:
-            logger.error(f"Error exporting users list: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error exporting users list: {str(e)}", exc_info=True)
             self.bot.answer_callback_query(
                 call.id,
                 "❌ خطا در استخراج لیست کاربران.",
@@ -1150,7 +1166,7 @@ class AdminHandler:
                 logger.warning(f"Could not log handler registration event: {str(e)}")
                 
         except Exception as e:
-            logger.error(f"Failed to register admin handlers: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Failed to register admin handlers: {str(e)}", exc_info=True)
             raise
 
     def handle_link(self, message: Message, user: TelegramUser):
@@ -1520,7 +1536,7 @@ class AdminHandler:
             logger.info(f"Users info list sent to admin {message.from_user.id}")
             
         except Exception as e:
-            logger.error(f"Error fetching users info: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error fetching users info: {str(e)}", exc_info=True)
             raise APIError("Failed to fetch users info")
 
     def _handle_user_action(self, call: CallbackQuery):
@@ -1819,7 +1835,7 @@ class AdminHandler:
                 }
             )
         except Exception as e:
-            logger.error(f"Error handling add client: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling add client: {str(e)}", exc_info=True)
             try:
                 self.bot.send_message(
                     message.chat.id,
@@ -1972,7 +1988,7 @@ class AdminHandler:
                 )
                 
         except Exception as e:
-            logger.error(f"Error toggling bot status: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error toggling bot status: {str(e)}", exc_info=True)
             self.bot.reply_to(
                 message,
                 "❌ خطا در تغییر وضعیت ربات\\. لطفاً دوباره تلاش کنید\\.",
@@ -4,7 +4,6 @@ from typing import Dict, List
 from ..utils.formatting import escape_markdown
 from ..utils.logger import CustomLogger
 from ..utils.exceptions import *
-import traceback
 from functools import wraps
 
 # Initialize custom logger
@@ -24,7 +23,7 @@ def handle_help_errors(func):
                 parse_mode='MarkdownV2'
             )
         except Exception as e:
-            logger.error(f"Unexpected error in {func.__name__}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Unexpected error in {func.__name__}: {str(e)}", exc_info=True)
             self.bot.reply_to(
                 message,
                 "❌ خطای غیرمنتظره\\. لطفاً بعداً تلاش کنید\\.",
@@ -99,7 +98,7 @@ class HelpHandler:
             logger.info(f"Help message sent successfully to user {user_id}")
             
         except Exception as e:
-            logger.error(f"Error formatting help message: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error formatting help message: {str(e)}", exc_info=True)
             
             try:
                 # Fallback to plain text without any formatting
@@ -121,7 +120,7 @@ class HelpHandler:
                 self.bot.reply_to(message, plain_text, parse_mode=None)
                 logger.info(f"Fallback plain text help sent to user {user_id}")
             except Exception as e2:
-                logger.error(f"Error sending fallback help message: {str(e2)}\n{traceback.format_exc()}")
+                logger.error(f"Error sending fallback help message: {str(e2)}", exc_info=True)
                 raise
 
     def register_handlers(self):
@@ -131,5 +130,5 @@ class HelpHandler:
             self.bot.message_handler(commands=['help'])(self.handle_help)
             logger.info("Help command handler registered successfully")
         except Exception as e:
-            logger.error(f"Failed to register help handler: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Failed to register help handler: {str(e)}", exc_info=True)
             raise 
\ No newline at end of file
@@ -7,13 +7,13 @@ from ..utils.panel_api import PanelAPI
 from ..utils.logger import CustomLogger
 from ..utils.exceptions import *
 from ..utils.first_version import format_remaining_days as first_version_format_remaining_days
+from ..utils.decorators import is_admin
 from ..utils.keyboards import (
     create_client_status_keyboard,
     create_traffic_options_keyboard,
     create_expiry_options_keyboard,
     create_stats_keyboard
 )
-import traceback
 from functools import wraps
 from datetime import datetime
 from typing import Optional
@@ -39,6 +39,20 @@ from ..models.base import SessionLocal
 # Initialize custom logger
 logger = CustomLogger("UserHandler")
 
+TEHRAN_TZ = pytz.timezone('Asia/Tehran')
+
+_STATUS_TEMPLATE = (
+    "📧 ایمیل : %(email)s\n"
+    "وضعیت : %(enable)s\n"
+    "آنلاین : %(online)s\n"
+    "🔼آپلود : %(up)s\n"
+    "🔽دانلود : %(down)s\n"
+    "➕مصرف کلی : %(used)s\n"
+    "🟥حجم خریداری شده : %(total)s\n"
+    "📅انقضا : %(expiry)s\n"
+    "\n⏳آخرین آپدیت مقادیر : %(updated)s"
+)
+
 def configure_retries(session):
     """Configure retry strategy for requests"""
     retry_strategy = Retry(
@@ -62,7 +76,7 @@ def handle_errors(func):
                 return
             elif "query is too old" in str(e).lower():
                 return
-            logger.error(f"API Error in {func.__name__}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"API Error in {func.__name__}: {str(e)}", exc_info=True)
             try:
                 self.bot.reply_to(
                     message,
@@ -82,7 +96,7 @@ def handle_errors(func):
             except:
                 pass
         except requests.exceptions.RequestException as e:
-            logger.error(f"Network Error in {func.__name__}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Network Error in {func.__name__}: {str(e)}", exc_info=True)
             try:
                 self.bot.reply_to(
                     message,
@@ -102,7 +116,7 @@ def handle_errors(func):
             except:
                 pass
         except Exception as e:
-            logger.error(f"Unexpected error in {func.__name__}: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Unexpected error in {func.__name__}: {str(e)}", exc_info=True)
             try:
                 self.bot.reply_to(
                     message,
@@ -135,7 +149,7 @@ class ExceptionHandler:
             elif "query is too old" in str(exception).lower():
                 return True  # Handled successfully
         
-        self.logger.error(f"Unhandled exception: {str(exception)}\n{traceback.format_exc()}")
+        self.logger.error(f"Unhandled exception: {str(exception)}", exc_info=True)
         return False  # Not handled
 
 class UserHandler:
@@ -236,60 +250,7 @@ class UserHandler:
             # Log complete client info for debugging
             logger.info(f"Complete client info: {json.dumps(client_info, indent=2)}")
 
-            # Get traffic values
-            down_bytes = client_info.get('down', 0)
-            up_bytes = client_info.get('up', 0)
-            total_bytes = client_info.get('total', 0)
-            total_usage = down_bytes + up_bytes
-
-            # Format traffic values with appropriate units
-            up_str = format_size(up_bytes)
-            down_str = format_size(down_bytes)
-            total_use_str = format_size(total_usage)
-            formatted_total = format_size(total_bytes) if total_bytes > 0 else "نامحدود"
-
-            # Get current time in Tehran timezone
-            time = datetime.now(pytz.timezone('Asia/Tehran'))
-            jtime = time.strftime('%Y/%m/%d %H:%M:%S')
-
-            # Build status string
-            Enable = "فعال 🟢" if client_info.get('enable', True) else "غیرفعال 🔴"
-            is_online = "آنلاین 🟢" if client_info.get('is_online', True) else "آفلاین 🔴"
-            email = client_info.get('email', 'نامشخص')
-
-            # Extract and log expiry time
-            expiry_time = client_info.get('expiryTime', 0)
-            logger.info(f"Raw expiry_time from client_info: {expiry_time}")
-            logger.info(f"Expiry time type: {type(expiry_time)}")
-            logger.info(f"All client_info keys: {list(client_info.keys())}")
-            
-            # Format expiry time using first version's function
-            formatted_remaining_days = first_version_format_remaining_days(expiry_time)
-            logger.info(f"Formatted remaining days: {formatted_remaining_days}")
-
-            # Format the message with escaped special characters
-            formatted_text = (
-                f"📧 ایمیل : {escape_markdown(email)}\n"
-                f"وضعیت : {escape_markdown(Enable)}\n"
-                f"آنلاین : {escape_markdown(is_online)}\n"
-                f"🔼آپلود : {escape_markdown(up_str)}\n"
-                f"🔽دانلود : {escape_markdown(down_str)}\n"
-                f"➕مصرف کلی : {escape_markdown(total_use_str)}\n"
-                f"🟥حجم خریداری شده : {escape_markdown(formatted_total)}\n"
-                f"📅انقضا : {escape_markdown(formatted_remaining_days)}\n"
-                f"\n⏳آخرین آپدیت مقادیر : {escape_markdown(jtime)}"
-            )
-
-            # Create keyboard with refresh button
-            keyboard = InlineKeyboardMarkup()
-            keyboard.row(
-                InlineKeyboardButton("🔄 بروزرسانی", callback_data=f"refresh_{identifier}")
-            )
-
-            # Create keyboard with admin buttons if needed
-            with SessionLocal() as db:
-                user = db.query(TelegramUser).filter_by(telegram_id=message.from_user.id).first()
-                keyboard = create_client_status_keyboard(identifier, user.is_admin if user else False)
+            formatted_text, keyboard = self._render_client_status(client_info, identifier, message.from_user.id)
 
             # Send message
             self.bot.reply_to(
@@ -354,7 +315,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "USAGE", vpn_link)
 
         except Exception as e:
-            logger.error(f"Error handling usage: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling usage: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در دریافت اطلاعات")
 
     @handle_errors
@@ -477,7 +438,7 @@ class UserHandler:
                 db.commit()
                 
         except Exception as e:
-            logger.error(f"Error handling state input: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling state input: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست. لطفا دوباره تلاش کنید.")
             
             # Reset user state on error
@@ -640,7 +601,7 @@ class UserHandler:
             return response
 
         except Exception as e:
-            logger.error(f"Error getting online users: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error getting online users: {str(e)}", exc_info=True)
             return f"""
 {format_bold('👥 کاربران آنلاین')}
 ━━━━━━━━━━━━━━━
@@ -716,7 +677,7 @@ class UserHandler:
             return response
 
         except Exception as e:
-            logger.error(f"Error generating daily report: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error generating daily report: {str(e)}", exc_info=True)
             return "❌ خطا در تولید گزارش روزانه"
 
     def _generate_usage_graph(self, client_uuid: str) -> Optional[str]:
@@ -827,7 +788,7 @@ class UserHandler:
             self.bot.reply_to(message, "❌ پیام نامعتبر است")
 
         except Exception as e:
-            logger.error(f"Error handling message: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling message: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش پیام")
 
     @handle_errors
@@ -866,7 +827,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "ADMIN", None)
 
         except Exception as e:
-            logger.error(f"Error handling admin command: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling admin command: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست")
 
     @handle_errors
@@ -920,7 +881,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "ONLINE_USERS", None)
 
         except Exception as e:
-            logger.error(f"Error handling online users command: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling online users command: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست")
 
     @handle_errors
@@ -985,7 +946,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "TOTAL_STATS", None)
 
         except Exception as e:
-            logger.error(f"Error handling total stats command: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling total stats command: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست")
 
     @handle_errors
@@ -1050,7 +1011,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "DAILY_REPORT", None)
 
         except Exception as e:
-            logger.error(f"Error handling daily report command: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling daily report command: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست")
 
     @handle_errors
@@ -1110,7 +1071,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "USAGE_GRAPH", None)
 
         except Exception as e:
-            logger.error(f"Error handling usage graph command: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling usage graph command: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست")
 
     def _generate_status_text(self, client_info: dict) -> str:
@@ -1171,7 +1132,7 @@ class UserHandler:
             return status
             
         except Exception as e:
-            logger.error(f"Error generating status text: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error generating status text: {str(e)}", exc_info=True)
             return "خطا در دریافت اطلاعات"
 
     def _log_activity(self, user_id: int, activity_type: str, target_uuid: str):
@@ -1242,193 +1203,172 @@ class UserHandler:
     def handle_callback(self, call: CallbackQuery):
         """Handle callback queries"""
         try:
-            # Get user info
-            with SessionLocal() as db:
-                user = db.query(TelegramUser).filter_by(telegram_id=call.from_user.id).first()
-                if not user:
-                    self.bot.answer_callback_query(call.id, "❌ کاربر یافت نشد")
-                    return
-
-            action, *params = call.data.split('_')
-            
-            if action == "refresh":
-                if params[0] == "system":
-                    # Handle system info refresh using the new function
-                    self._handle_system_info_refresh(call)
-                else:
-                    # Handle client refresh
-                    client_uuid = params[0]
-                    self._handle_refresh(call, client_uuid)
-                
-            elif action == "stats":
-                client_uuid = params[0]
-                # Display statistics options
-                keyboard = create_stats_keyboard(client_uuid)
-                try:
-                    self.bot.edit_message_text(
-                        "📊 *آمار و گزارشات*\n\nلطفا گزینه مورد نظر را انتخاب کنید:",
-                        call.message.chat.id,
-                        call.message.message_id,
-                        reply_markup=keyboard,
-                        parse_mode='MarkdownV2'
-                    )
-                except apihelper.ApiTelegramException as e:
-                    if "message is not modified" not in str(e).lower():
-                        raise
-                    self.bot.answer_callback_query(call.id, "✅ اطلاعات بروز است")
-                
-            elif action == "back":
-                client_uuid = params[0]
-                self._handle_refresh(call, client_uuid)
-                
-            elif action in ["edit", "extend", "delete", "reset"] and user.is_admin:
-                client_uuid = params[0]
-                if action == "edit":
-                    keyboard = create_traffic_options_keyboard(client_uuid)
-                    try:
-                        self.bot.edit_message_text(
-                            "✏️ *ویرایش تنظیمات*\n\nلطفا حجم جدید را انتخاب کنید:",
-                            call.message.chat.id,
-                            call.message.message_id,
-                            reply_markup=keyboard,
-                            parse_mode='MarkdownV2'
-                        )
-                    except apihelper.ApiTelegramException as e:
-                        if "message is not modified" not in str(e).lower():
-                            raise
-                        self.bot.answer_callback_query(call.id, "✅ اطلاعات بروز است")
-                elif action == "extend":
-                    keyboard = create_expiry_options_keyboard(client_uuid)
-                    try:
-                        self.bot.edit_message_text(
-                            "⚡️ *تمدید سرویس*\n\nلطفا مدت زمان تمدید را انتخاب کنید:",
-                            call.message.chat.id,
-                            call.message.message_id,
-                            reply_markup=keyboard,
-                            parse_mode='MarkdownV2'
-                        )
-                    except apihelper.ApiTelegramException as e:
-                        if "message is not modified" not in str(e).lower():
-                            raise
-                        self.bot.answer_callback_query(call.id, "✅ اطلاعات بروز است")
-                elif action == "delete":
-                    # Get client info to get inbound_id
-                    client_info = self.panel_api.get_client_info(uuid=client_uuid)
-                    if client_info and client_info.get('inbound_id'):
-                        # Use the new API endpoint with inbound_id
-                        success = self.panel_api.delete_client(
-                            client_uuid, 
-                            inbound_id=client_info.get('inbound_id')
-                        )
-                    else:
-                        # Fallback to legacy method
-                        success = self.panel_api.delete_client(client_uuid)
-                        
-                    if success:
-                        self.bot.answer_callback_query(call.id, "✅ کاربر با موفقیت حذف شد")
-                        self.bot.delete_message(call.message.chat.id, call.message.message_id)
-                    else:
-                        self.bot.answer_callback_query(call.id, "❌ خطا در حذف کاربر")
-                elif action == "reset":
-                    # Get client info to get inbound_id and email
-                    client_info = self.panel_api.get_client_info(uuid=client_uuid)
-                    if client_info and client_info.get('inbound_id') and client_info.get('email'):
-                        # Use the new API endpoint with inbound_id and email
-                        success = self.panel_api.reset_traffic(
-                            client_uuid, 
-                            inbound_id=client_info.get('inbound_id'),
-                            email=client_info.get('email')
-                        )
-                    else:
-                        # Fallback to legacy method
-                        success = self.panel_api.reset_traffic(client_uuid)
-                        
-                    if success:
-                        self.bot.answer_callback_query(call.id, "✅ ترافیک با موفقیت ریست شد")
-                        self._handle_refresh(call, client_uuid)
-                    else:
-                        self.bot.answer_callback_query(call.id, "❌ خطا در ریست ترافیک")
-            
-            elif action == "settraffic" and user.is_admin:
-                client_uuid, gb = params
-                # Get client info to get inbound_id
-                client_info = self.panel_api.get_client_info(uuid=client_uuid)
-                
-                success = self.panel_api.set_traffic(client_uuid, int(gb))
-                if success:
-                    self.bot.answer_callback_query(call.id, f"✅ حجم با موفقیت به {gb}GB تنظیم شد")
-                    self._handle_refresh(call, client_uuid)
-                else:
-                    self.bot.answer_callback_query(call.id, "❌ خطا در تنظیم حجم", show_alert=True)
+            # callback_data is "<action>_<rest>"; only split once so uuids stay intact
+            action, _, rest = call.data.partition('_')
+            if action == "custom":
+                kind, _, rest = rest.partition('_')
+                action += kind
             
-            elif action == "setexpiry" and user.is_admin:
-                client_uuid, days = params
-                
-                success = self.panel_api.set_expiry(client_uuid, int(days))
-                if success:
-                    days_text = "نامحدود" if int(days) == 0 else f"{days} روز"
-                    self.bot.answer_callback_query(call.id, f"✅ تاریخ انقضا با موفقیت به {days_text} تنظیم شد")
-                    self._handle_refresh(call, client_uuid)
-                else:
-                    self.bot.answer_callback_query(call.id, "❌ خطا در تنظیم تاریخ انقضا", show_alert=True)
-            
-            elif action == "setunlimited" and user.is_admin:
-                client_uuid = params[0]
-                
-                success = self.panel_api.set_unlimited(client_uuid)
-                if success:
-                    self.bot.answer_callback_query(call.id, "✅ حجم با موفقیت نامحدود شد")
-                    self._handle_refresh(call, client_uuid)
-                else:
-                    self.bot.answer_callback_query(call.id, "❌ خطا در تنظیم حجم نامحدود", show_alert=True)
-            
-            elif (action == "customtraffic" or action == "custom_traffic") and user.is_admin:
-                client_uuid = params[0]
-                
-                # Force user to state for getting custom traffic
-                with SessionLocal() as db:
-                    db.query(TelegramUser).filter_by(telegram_id=call.from_user.id).update({
-                        "state": f"ing_custom_traffic:{client_uuid}"
-                    })
-                    db.commit()
-                
-                self.bot.answer_callback_query(call.id)
-                self.bot.send_message(
-                    call.message.chat.id,
-                    "🔢 *حجم دلخواه*\n\nلطفا حجم مورد نظر را به گیگابایت وارد کنید\\. مثال: `50`",
-                    parse_mode='MarkdownV2'
-                )
-            
-            elif (action == "customexpiry" or action == "custom_expiry") and user.is_admin:
-                client_uuid = params[0]
-                
-                # Force user to state for getting custom expiry
-                with SessionLocal() as db:
-                    db.query(TelegramUser).filter_by(telegram_id=call.from_user.id).update({
-                        "state": f"ing_custom_expiry:{client_uuid}"
-                    })
-                    db.commit()
-                
-                self.bot.answer_callback_query(call.id)
-                self.bot.send_message(
-                    call.message.chat.id,
-                    "📅 *تاریخ دلخواه*\n\nلطفا تعداد روز مورد نظر را وارد کنید\\. مثال: `30`",
-                    parse_mode='MarkdownV2'
-                )
+            handler = self._CALLBACK_HANDLERS.get(action)
+            # Only admin-only actions need the admin lookup
+            if handler and (action not in self._ADMIN_CALLBACKS or is_admin(call.from_user.id)):
+                handler(self, call, rest)
             
             # Log activity
-            self._log_activity(call.from_user.id, f"CALLBACK_{action.upper()}", '_'.join(params))
+            self._log_activity(call.from_user.id, f"CALLBACK_{action.upper()}", rest)
             
         except apihelper.ApiTelegramException as e:
             if "message is not modified" in str(e).lower():
                 self.bot.answer_callback_query(call.id, "✅ اطلاعات بروز است")
             else:
-                logger.error(f"Error handling callback: {str(e)}\n{traceback.format_exc()}")
+                logger.error(f"Error handling callback: {str(e)}", exc_info=True)
                 self.bot.answer_callback_query(call.id, "❌ خطا در پردازش درخواست")
         except Exception as e:
-            logger.error(f"Error handling callback: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling callback: {str(e)}", exc_info=True)
             self.bot.answer_callback_query(call.id, "❌ خطا در پردازش درخواست")
 
+    def _edit_callback_menu(self, call: CallbackQuery, text: str, keyboard):
+        try:
+            self.bot.edit_message_text(
+                text,
+                call.message.chat.id,
+                call.message.message_id,
+                reply_markup=keyboard,
+                parse_mode='MarkdownV2'
+            )
+        except apihelper.ApiTelegramException as e:
+            if "message is not modified" not in str(e).lower():
+                raise
+            self.bot.answer_callback_query(call.id, "✅ اطلاعات بروز است")
+
+    def _on_refresh_callback(self, call: CallbackQuery, rest: str):
+        if rest == "system":
+            # Handle system info refresh using the new function
+            self._handle_system_info_refresh(call)
+        else:
+            # Handle client refresh
+            self._handle_refresh(call, rest)
+
+    def _on_stats_callback(self, call: CallbackQuery, client_uuid: str):
+        # Display statistics options
+        self._edit_callback_menu(
+            call,
+            "📊 *آمار و گزارشات*\n\nلطفا گزینه مورد نظر را انتخاب کنید:",
+            create_stats_keyboard(client_uuid)
+        )
+
+    def _on_edit_callback(self, call: CallbackQuery, client_uuid: str):
+        self._edit_callback_menu(
+            call,
+            "✏️ *ویرایش تنظیمات*\n\nلطفا حجم جدید را انتخاب کنید:",
+            create_traffic_options_keyboard(client_uuid)
+        )
+
+    def _on_extend_callback(self, call: CallbackQuery, client_uuid: str):
+        self._edit_callback_menu(
+            call,
+            "⚡️ *تمدید سرویس*\n\nلطفا مدت زمان تمدید را انتخاب کنید:",
+            create_expiry_options_keyboard(client_uuid)
+        )
+
+    def _on_delete_callback(self, call: CallbackQuery, client_uuid: str):
+        # Get client info to get inbound_id
+        client_info = self.panel_api.get_client_info(uuid=client_uuid)
+        if client_info and client_info.get('inbound_id'):
+            # Use the new API endpoint with inbound_id
+            success = self.panel_api.delete_client(
+                client_uuid, 
+                inbound_id=client_info.get('inbound_id')
+            )
+        else:
+            # Fallback to legacy method
+            success = self.panel_api.delete_client(client_uuid)
+            
+        if success:
+            self.bot.answer_callback_query(call.id, "✅ کاربر با موفقیت حذف شد")
+            self.bot.delete_message(call.message.chat.id, call.message.message_id)
+        else:
+            self.bot.answer_callback_query(call.id, "❌ خطا در حذف کاربر")
+
+    def _on_reset_callback(self, call: CallbackQuery, client_uuid: str):
+        # Get client info to get inbound_id and email
+        client_info = self.panel_api.get_client_info(uuid=client_uuid)
+        if client_info and client_info.get('inbound_id') and client_info.get('email'):
+            # Use the new API endpoint with inbound_id and email
+            success = self.panel_api.reset_traffic(
+                client_uuid, 
+                inbound_id=client_info.get('inbound_id'),
+                email=client_info.get('email')
+            )
+        else:
+            # Fallback to legacy method
+            success = self.panel_api.reset_traffic(client_uuid)
+            
+        if success:
+            self.bot.answer_callback_query(call.id, "✅ ترافیک با موفقیت ریست شد")
+            self._handle_refresh(call, client_uuid)
+        else:
+            self.bot.answer_callback_query(call.id, "❌ خطا در ریست ترافیک")
+
+    def _on_settraffic_callback(self, call: CallbackQuery, rest: str):
+        client_uuid, _, gb = rest.rpartition('_')
+        
+        success = self.panel_api.set_traffic(client_uuid, int(gb))
+        if success:
+            self.bot.answer_callback_query(call.id, f"✅ حجم با موفقیت به {gb}GB تنظیم شد")
+            self._handle_refresh(call, client_uuid)
+        else:
+            self.bot.answer_callback_query(call.id, "❌ خطا در تنظیم حجم", show_alert=True)
+
+    def _on_setexpiry_callback(self, call: CallbackQuery, rest: str):
+        client_uuid, _, days = rest.rpartition('_')
+        
+        success = self.panel_api.set_expiry(client_uuid, int(days))
+        if success:
+            days_text = "نامحدود" if int(days) == 0 else f"{days} روز"
+            self.bot.answer_callback_query(call.id, f"✅ تاریخ انقضا با موفقیت به {days_text} تنظیم شد")
+            self._handle_refresh(call, client_uuid)
+        else:
+            self.bot.answer_callback_query(call.id, "❌ خطا در تنظیم تاریخ انقضا", show_alert=True)
+
+    def _on_setunlimited_callback(self, call: CallbackQuery, client_uuid: str):
+        success = self.panel_api.set_unlimited(client_uuid)
+        if success:
+            self.bot.answer_callback_query(call.id, "✅ حجم با موفقیت نامحدود شد")
+            self._handle_refresh(call, client_uuid)
+        else:
+            self.bot.answer_callback_query(call.id, "❌ خطا در تنظیم حجم نامحدود", show_alert=True)
+
+    def _on_customtraffic_callback(self, call: CallbackQuery, client_uuid: str):
+        # Force user to state for getting custom traffic
+        with SessionLocal() as db:
+            db.query(TelegramUser).filter_by(telegram_id=call.from_user.id).update({
+                "state": f"ing_custom_traffic:{client_uuid}"
+            })
+            db.commit()
+        
+        self.bot.answer_callback_query(call.id)
+        self.bot.send_message(
+            call.message.chat.id,
+            "🔢 *حجم دلخواه*\n\nلطفا حجم مورد نظر را به گیگابایت وارد کنید\\. مثال: `50`",
+            parse_mode='MarkdownV2'
+        )
+
+    def _on_customexpiry_callback(self, call: CallbackQuery, client_uuid: str):
+        # Force user to state for getting custom expiry
+        with SessionLocal() as db:
+            db.query(TelegramUser).filter_by(telegram_id=call.from_user.id).update({
+                "state": f"ing_custom_expiry:{client_uuid}"
+            })
+            db.commit()
+        
+        self.bot.answer_callback_query(call.id)
+        self.bot.send_message(
+            call.message.chat.id,
+            "📅 *تاریخ دلخواه*\n\nلطفا تعداد روز مورد نظر را وارد کنید\\. مثال: `30`",
+            parse_mode='MarkdownV2'
+        )
+
     def _retry_operation(self, operation, *args, max_retries=3, **kwargs):
         """Helper method to retry operations with exponential backoff"""
         last_error = None
@@ -1451,6 +1391,36 @@ class UserHandler:
         self.logger.error(f"Operation failed after {max_retries} retries: {str(last_error)}")
         raise last_error
 
+    def _render_client_status(self, client_info: dict, identifier: str, telegram_id: int):
+        """Build the client status text and its keyboard for a panel client"""
+        down_bytes = client_info.get('down', 0)
+        up_bytes = client_info.get('up', 0)
+        total_bytes = client_info.get('total', 0)
+
+        # Format expiry time using first version's function
+        expiry_time = client_info.get('expiryTime', 0)
+        if expiry_time <= int(datetime.now().timestamp() * 1000):
+            formatted_remaining_days = "فاقد تاریخ انقضا"
+        else:
+            formatted_remaining_days = first_version_format_remaining_days(expiry_time)
+
+        formatted_text = _STATUS_TEMPLATE % {
+            'email': escape_markdown(client_info.get('email', 'نامشخص')),
+            'enable': escape_markdown("فعال 🟢" if client_info.get('enable', True) else "غیرفعال 🔴"),
+            'online': escape_markdown("آنلاین 🟢" if client_info.get('is_online', True) else "آفلاین 🔴"),
+            'up': escape_markdown(format_size(up_bytes)),
+            'down': escape_markdown(format_size(down_bytes)),
+            'used': escape_markdown(format_size(down_bytes + up_bytes)),
+            'total': escape_markdown(format_size(total_bytes) if total_bytes > 0 else "نامحدود"),
+            'expiry': escape_markdown(formatted_remaining_days),
+            'updated': escape_markdown(datetime.now(TEHRAN_TZ).strftime('%Y/%m/%d %H:%M:%S')),
+        }
+
+        # Create keyboard with admin buttons if needed
+        keyboard = create_client_status_keyboard(identifier, is_admin(telegram_id))
+
+        return formatted_text, keyboard
+
     def _handle_refresh(self, call: CallbackQuery, identifier: str):
         """Handle refresh callback for client status"""
         try:
@@ -1487,58 +1457,7 @@ class UserHandler:
                         raise
                 return
 
-            # Get traffic values
-            down_bytes = client_info.get('down', 0)
-            up_bytes = client_info.get('up', 0)
-            total_bytes = client_info.get('total', 0)
-            total_usage = down_bytes + up_bytes
-
-            # Format traffic values with appropriate units
-            up_str = format_size(up_bytes)
-            down_str = format_size(down_bytes)
-            total_use_str = format_size(total_usage)
-            formatted_total = format_size(total_bytes) if total_bytes > 0 else "نامحدود"
-
-            # Get current time in Tehran timezone
-            time = datetime.now(pytz.timezone('Asia/Tehran'))
-            jtime = time.strftime('%Y/%m/%d %H:%M:%S')
-
-            # Build status string
-            Enable = "فعال 🟢" if client_info.get('enable', True) else "غیرفعال 🔴"
-            
-            is_online = "آنلاین 🟢" if client_info.get('is_online', True) else "آفلاین 🔴"
-            email = client_info.get('email', 'نامشخص')
-
-            # Format expiry time using first version's function
-            expiry_time = client_info.get('expiryTime', 0)  # Changed from expire_time to expiryTime
-            if expiry_time <= int(datetime.now().timestamp() * 1000):
-                formatted_remaining_days = "فاقد تاریخ انقضا"
-            else:
-                formatted_remaining_days = first_version_format_remaining_days(expiry_time)
-
-            # Format the message with escaped special characters
-            formatted_text = (
-                f"📧 ایمیل : {escape_markdown(email)}\n"
-                f"وضعیت : {escape_markdown(Enable)}\n"
-                f"آنلاین : {escape_markdown(is_online)}\n"
-                f"🔼آپلود : {escape_markdown(up_str)}\n"
-                f"🔽دانلود : {escape_markdown(down_str)}\n"
-                f"➕مصرف کلی : {escape_markdown(total_use_str)}\n"
-                f"🟥حجم خریداری شده : {escape_markdown(formatted_total)}\n"
-                f"📅انقضا : {escape_markdown(formatted_remaining_days)}\n"
-                f"\n⏳آخرین آپدیت مقادیر : {escape_markdown(jtime)}"
-            )
-
-            # Create keyboard with refresh button
-            keyboard = InlineKeyboardMarkup()
-            keyboard.row(
-                InlineKeyboardButton("🔄 بروزرسانی", callback_data=f"refresh_{identifier}")
-            )
-
-            # Create keyboard with admin buttons if needed
-            with SessionLocal() as db:
-                user = db.query(TelegramUser).filter_by(telegram_id=call.from_user.id).first()
-                keyboard = create_client_status_keyboard(identifier, user.is_admin if user else False)
+            formatted_text, keyboard = self._render_client_status(client_info, identifier, call.from_user.id)
 
             try:
                 # Try to update existing message
@@ -1603,7 +1522,7 @@ class UserHandler:
             self._log_activity(call.from_user.id, "REFRESH_STATUS", identifier)
             
         except Exception as e:
-            logger.error(f"Error refreshing status: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error refreshing status: {str(e)}", exc_info=True)
             try:
                 self.bot.answer_callback_query(
                     call.id,
@@ -1646,7 +1565,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "START", None)
 
         except Exception as e:
-            logger.error(f"Error handling start command: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling start command: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست")
 
     @handle_errors
@@ -1687,7 +1606,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "HELP", None)
 
         except Exception as e:
-            logger.error(f"Error handling help command: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling help command: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست")
 
     @handle_errors
@@ -1747,7 +1666,7 @@ class UserHandler:
             self._log_activity(message.from_user.id, "SYSTEM_INFO", None)
 
         except Exception as e:
-            logger.error(f"Error handling system info command: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error handling system info command: {str(e)}", exc_info=True)
             self.bot.reply_to(message, "❌ خطا در پردازش درخواست")
 
     def _handle_system_info_refresh(self, call: CallbackQuery):
@@ -1795,7 +1714,7 @@ class UserHandler:
                 self.bot.answer_callback_query(call.id, "✅ اطلاعات بروز است")
                 
         except Exception as e:
-            logger.error(f"Error refreshing system info: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error refreshing system info: {str(e)}", exc_info=True)
             try:
                 self.bot.answer_callback_query(
                     call.id,
@@ -1804,4 +1723,24 @@ class UserHandler:
                 )
             except apihelper.ApiTelegramException as e:
                 if "query is too old" not in str(e).lower():
-                    raise
\ No newline at end of file
+                    raise
+
+    # Callback action -> handler; each handler gets the callback_data after "<action>_"
+    _CALLBACK_HANDLERS = {
+        "refresh": _on_refresh_callback,
+        "stats": _on_stats_callback,
+        "back": _handle_refresh,
+        "edit": _on_edit_callback,
+        "extend": _on_extend_callback,
+        "delete": _on_delete_callback,
+        "reset": _on_reset_callback,
+        "settraffic": _on_settraffic_callback,
+        "setexpiry": _on_setexpiry_callback,
+        "setunlimited": _on_setunlimited_callback,
+        "customtraffic": _on_customtraffic_callback,
+        "customexpiry": _on_customexpiry_callback,
+    }
+    _ADMIN_CALLBACKS = frozenset((
+        "edit", "extend", "delete", "reset", "settraffic", "setexpiry",
+        "setunlimited", "customtraffic", "customexpiry",
+    ))
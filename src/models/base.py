@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+from typing import Iterator
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
@@ -8,8 +10,11 @@ from urllib.parse import quote_plus
 SQLALCHEMY_DATABASE_URL = f"mysql://{DB_USER}:{quote_plus(DB_PASSWORD)}@{DB_HOST}/{DB_NAME}?charset=utf8mb4"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
+    pool_timeout=10,
     pool_pre_ping=True,
-    pool_recycle=3600
+    pool_recycle=1800
 )
 
 # Create session factory
@@ -18,13 +23,15 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create base class for models
 Base = declarative_base()
 
-def get_db() -> Session:
-    """Get database session"""
+@contextmanager
+def get_db() -> Iterator[Session]:
+    """Get database session, closed when the ``with`` block exits"""
     db = SessionLocal()
     try:
-        return db
+        yield db
     except Exception as e:
         db.rollback()
         raise e
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+ 
\ No newline at end of file
@@ -12,7 +12,6 @@ from telebot import TeleBot
 import gzip
 import shutil
 import re
-import traceback
 import logging
 from functools import wraps
 import backoff
@@ -240,7 +239,7 @@ class BackupManager:
                 
             except Exception as e:
                 error_msg = str(e)
-                logger.error(f"Error creating backup: {error_msg}\n{traceback.format_exc()}")
+                logger.error(f"Error creating backup: {error_msg}", exc_info=True)
                 
                 # Send error message to user
                 error_response = f"""
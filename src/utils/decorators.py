@@ -7,6 +7,21 @@ from sqlalchemy.orm import Session
 from src.models.base import SessionLocal
 from proj import ADMIN_IDS
 
+ADMIN_ID_SET = frozenset(int(admin_id) for admin_id in ADMIN_IDS)
+
+
+def is_admin(telegram_id: int) -> bool:
+    """Check the configured admin ids first, then the user's is_admin flag"""
+    if telegram_id in ADMIN_ID_SET:
+        return True
+    try:
+        with SessionLocal() as db:
+            user = db.query(TelegramUser.is_admin).filter_by(telegram_id=telegram_id).first()
+            return bool(user and user.is_admin)
+    except Exception as e:
+        print(f"Error checking admin status: {str(e)}")
+        return False
+
 
 def admin_required(func: Callable) -> Callable:
     """Decorator to check if the user is an admin"""
@@ -15,19 +30,10 @@ def admin_required(func: Callable) -> Callable:
         if not message.from_user:
             return None
 
-        # Check hardcoded admin list
-        if message.from_user.id in ADMIN_IDS:
+        # Check hardcoded admin list, then database admin status
+        if is_admin(message.from_user.id):
             return func(self, message, *args, **kwargs)
 
-        # Check database admin status
-        try:
-            with SessionLocal() as db:
-                user = db.query(TelegramUser).filter_by(telegram_id=message.from_user.id).first()
-                if user and user.is_admin:
-                    return func(self, message, *args, **kwargs)
-        except Exception as e:
-            print(f"Error checking admin status: {str(e)}")
-
         # If not admin, send error message
         self.bot.reply_to(
             message,
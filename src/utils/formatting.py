@@ -1,7 +1,9 @@
 from typing import Dict, Any, List, Union
 from datetime import datetime, timezone
-import pytz
+from functools import lru_cache
+from zoneinfo import ZoneInfo
 import re
+import ciso8601
 from persiantools.jdatetime import JalaliDateTime
 
 from .logger import CustomLogger
@@ -9,6 +11,26 @@ from .logger import CustomLogger
 # Initialize logger
 logger = CustomLogger("Formatting")
 
+# Resolved once at import; every date helper below converts into this zone
+TEHRAN_TZ = ZoneInfo('Asia/Tehran')
+
+# Jalali date and Tehran time, e.g. 1403/01/15 13:45:00
+_DATE_TEMPLATE = "{:04d}/{:02d}/{:02d} {:02d}:{:02d}:{:02d}"
+
+@lru_cache(maxsize=4096)
+def _format_epoch(seconds: float) -> str:
+    """Format Unix seconds as a Jalali date and Tehran time.
+
+    Cached because the same expiry/last-connection values repeat across the
+    clients of a panel.
+    """
+    dt_tehran = datetime.fromtimestamp(seconds, tz=TEHRAN_TZ)
+    jdate = JalaliDateTime.to_jalali(dt_tehran)
+    return _DATE_TEMPLATE.format(
+        jdate.year, jdate.month, jdate.day,
+        dt_tehran.hour, dt_tehran.minute, dt_tehran.second
+    )
+
 def format_size(size_bytes: float) -> str:
     """Format bytes to human readable size with proper unit"""
     try:
@@ -62,8 +84,15 @@ def format_date(timestamp: Union[int, float, str]) -> str:
                 timestamp = float(timestamp)
                 logger.info(f"format_date: converted string to float: {timestamp}")
             except ValueError:
-                logger.error(f"format_date: invalid string timestamp: {timestamp}")
-                return "نامشخص"
+                try:
+                    dt = ciso8601.parse_datetime(timestamp)
+                except ValueError:
+                    logger.error(f"format_date: invalid string timestamp: {timestamp}")
+                    return "نامشخص"
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=timezone.utc)
+                timestamp = dt.timestamp()
+                logger.info(f"format_date: parsed ISO string to seconds: {timestamp}")
                 
         # Handle zero or negative timestamps
         if timestamp <= 0:
@@ -75,25 +104,8 @@ def format_date(timestamp: Union[int, float, str]) -> str:
             timestamp = timestamp / 1000
             logger.info(f"format_date: converted from milliseconds to seconds: {timestamp}")
             
-        # Create datetime object in UTC
-        dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-        logger.info(f"format_date: UTC datetime: {dt}")
-        
-        # Convert to Tehran timezone
-        tehran_tz = pytz.timezone('Asia/Tehran')
-        dt_tehran = dt.astimezone(tehran_tz)
-        logger.info(f"format_date: Tehran datetime: {dt_tehran}")
-        
-        # Convert to Jalali date
-        jdate = JalaliDateTime.to_jalali(dt_tehran)
-        logger.info(f"format_date: Jalali date: {jdate}")
-        
-        # Format the date and time
-        date_str = jdate.strftime('%Y/%m/%d')
-        time_str = dt_tehran.strftime('%H:%M:%S')
-        
-        # Always return the full date and time
-        return f"{date_str} {time_str}"
+        # Always return the full Jalali date and Tehran time
+        return _format_epoch(timestamp)
             
     except Exception as e:
         logger.error(f"Error formatting date (timestamp={timestamp}, type={type(timestamp)}): {str(e)}")
@@ -331,12 +343,11 @@ def format_remaining_time(expiry_timestamp: Union[int, float, str]) -> str:
             logger.info(f"format_remaining_time: converted from milliseconds to seconds: {expiry_timestamp}")
             
         # Get current time in Tehran timezone
-        tehran_tz = pytz.timezone('Asia/Tehran')
-        now = datetime.now(tehran_tz)
+        now = datetime.now(TEHRAN_TZ)
         
         # Convert expiry timestamp to datetime
         expiry_dt = datetime.fromtimestamp(expiry_timestamp, tz=timezone.utc)
-        expiry_dt = expiry_dt.astimezone(tehran_tz)
+        expiry_dt = expiry_dt.astimezone(TEHRAN_TZ)
         logger.info(f"format_remaining_time: Expiry datetime (Tehran): {expiry_dt}")
         
         # Calculate time difference
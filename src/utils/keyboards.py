@@ -1,3 +1,4 @@
+from itertools import batched
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 def create_client_status_keyboard(client_uuid: str, is_admin: bool) -> InlineKeyboardMarkup:
@@ -30,14 +31,11 @@ def create_traffic_options_keyboard(client_uuid: str) -> InlineKeyboardMarkup:
     traffic_options = [5, 10, 20, 50, 100, 200, 500, 1000]
     
     # Create rows with three buttons each
-    for i in range(0, len(traffic_options), 3):
-        row = []
-        for gb in traffic_options[i:i+3]:
-            row.append(InlineKeyboardButton(
-                f"{gb}GB",
-                callback_data=f"settraffic_{client_uuid}_{gb}"
-            ))
-        keyboard.row(*row)
+    for chunk in batched(traffic_options, 3):
+        keyboard.row(*[
+            InlineKeyboardButton(f"{gb}GB", callback_data=f"settraffic_{client_uuid}_{gb}")
+            for gb in chunk
+        ])
     
     # Add unlimited and custom traffic buttons
     keyboard.row(
@@ -57,14 +55,11 @@ def create_expiry_options_keyboard(client_uuid: str) -> InlineKeyboardMarkup:
     expiry_options = [7, 15, 30, 60, 90, 180, 365]
     
     # Create rows with three buttons each
-    for i in range(0, len(expiry_options), 3):
-        row = []
-        for days in expiry_options[i:i+3]:
-            row.append(InlineKeyboardButton(
-                f"{days} روز",
-                callback_data=f"setexpiry_{client_uuid}_{days}"
-            ))
-        keyboard.row(*row)
+    for chunk in batched(expiry_options, 3):
+        keyboard.row(*[
+            InlineKeyboardButton(f"{days} روز", callback_data=f"setexpiry_{client_uuid}_{days}")
+            for days in chunk
+        ])
     
     # Add unlimited and custom expiry buttons
     keyboard.row(
@@ -2,8 +2,18 @@ import logging
 import logging.handlers
 import os
 from datetime import datetime
+from functools import cache
 from pathlib import Path
 
+
+@cache
+def _logs_dir() -> Path:
+    """temp_logs directory in the current directory, created on first use"""
+    logs_dir = Path(os.getcwd()) / 'temp_logs'
+    logs_dir.mkdir(exist_ok=True)
+    return logs_dir
+
+
 class CustomLogger:
     """Custom logger with file and console output"""
     
@@ -22,9 +32,7 @@ class CustomLogger:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
-        # Create temp_logs directory in current directory
-        logs_dir = Path(os.getcwd()) / 'temp_logs'
-        logs_dir.mkdir(exist_ok=True)
+        logs_dir = _logs_dir()
         
         # Create file handler
         try:
@@ -54,14 +62,14 @@ class CustomLogger:
     def info(self, message):
         self.logger.info(message)
         
-    def warning(self, message):
-        self.logger.warning(message)
+    def warning(self, message, exc_info=False):
+        self.logger.warning(message, exc_info=exc_info)
         
-    def error(self, message):
-        self.logger.error(message)
+    def error(self, message, exc_info=False):
+        self.logger.error(message, exc_info=exc_info)
         
-    def critical(self, message):
-        self.logger.critical(message)
+    def critical(self, message, exc_info=False):
+        self.logger.critical(message, exc_info=exc_info)
     
     def exception(self, message: str, *args, exc_info=True, **kwargs):
         self.logger.exception(message, *args, exc_info=exc_info, **kwargs)
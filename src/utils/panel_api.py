@@ -8,12 +8,16 @@ from ..utils.exceptions import APIError
 from datetime import datetime
 import pytz
 import time
-import traceback
+import threading
+from cachetools import TTLCache
 from ..utils.jalali_datetime import JalaliDateTime
 
 # Initialize logger
 logger = CustomLogger("PanelAPI")
 
+# Client lookups are reused for this many seconds, roughly one "refresh" press
+CLIENT_CACHE_TTL = 15
+
 class PanelAPI:
     def __init__(self, base_url: str, username: str, password: str):
         self.base_url = base_url.rstrip('/')
@@ -21,6 +25,13 @@ class PanelAPI:
         self.password = password
         self.session = requests.Session()
         self._session_cookie = None
+        self._client_cache: TTLCache = TTLCache(maxsize=4096, ttl=CLIENT_CACHE_TTL)
+        self._client_cache_lock = threading.Lock()
+
+    def invalidate_client(self, uuid: Optional[str]) -> None:
+        """Drop a cached client lookup after it has been changed on the panel"""
+        with self._client_cache_lock:
+            self._client_cache.pop(uuid, None)
 
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Make HTTP request to panel API with proper error handling"""
@@ -126,6 +137,22 @@ class PanelAPI:
             return None
 
     def get_client_info(self, uuid: Optional[str] = None, email: Optional[str] = None, inbound_id: Optional[int] = None) -> Dict[str, Any]:
+        """Get client information, serving UUID lookups from a short-lived cache"""
+        if uuid and not email:
+            with self._client_cache_lock:
+                cached = self._client_cache.get(uuid)
+            if cached is not None:
+                logger.debug(f"Client info cache hit for UUID: {uuid}")
+                return dict(cached)
+
+        client_info = self._fetch_client_info(uuid=uuid, email=email, inbound_id=inbound_id)
+
+        if uuid and not email and client_info:
+            with self._client_cache_lock:
+                self._client_cache[uuid] = dict(client_info)
+        return client_info
+
+    def _fetch_client_info(self, uuid: Optional[str] = None, email: Optional[str] = None, inbound_id: Optional[int] = None) -> Dict[str, Any]:
         """Get client information by UUID or email and optionally inbound_id
         
         Args:
@@ -595,6 +622,7 @@ class PanelAPI:
             endpoint = f"/panel/api/inbounds/{inbound_id}/resetClientTraffic/{email}"
             logger.info(f"Resetting traffic for user {email} in inbound {inbound_id}")
             response = self._make_request('POST', endpoint)
+            self.invalidate_client(uuid)
             
             # Verify success
             if isinstance(response, dict):
@@ -658,6 +686,7 @@ class PanelAPI:
             endpoint = f"/panel/api/inbounds/{inbound_id}/delClient/{uuid}"
             logger.info(f"Deleting client {uuid} from inbound {inbound_id}")
             response = self._make_request('POST', endpoint)
+            self.invalidate_client(uuid)
             
             # Verify success - response is already a dict from _make_request
             if isinstance(response, dict):
@@ -680,6 +709,9 @@ class PanelAPI:
         try:
             logger.info(f"Updating client {uuid} with traffic_gb={traffic_gb}, expiry_days={expiry_days}, expiry_time={expiry_time}")
             
+            # Start from the panel's current state, never from a cached copy
+            self.invalidate_client(uuid)
+            
             # Get current client info to update specific fields
             client_info = self.get_client_info(uuid=uuid)
             if not client_info:
@@ -751,21 +783,27 @@ class PanelAPI:
             
             # Send update request
             endpoint = f"/panel/api/inbounds/updateClient/{uuid}"
-            response = self._make_request('POST', endpoint, json=payload)
+            data = self._make_request('POST', endpoint, json=payload)
             
             # Check response
-            data = response.json()
             success = data.get('success', False)
             
             if success:
                 logger.info(f"Successfully updated client {uuid}")
+                # Cache the lookup with the new limits applied so the status
+                # refresh that follows doesn't need another panel round-trip
+                client_info.update(client_details)
+                if 'totalGB' in client_details:
+                    client_info['total'] = client_details['totalGB']
+                with self._client_cache_lock:
+                    self._client_cache[uuid] = client_info
             else:
                 logger.error(f"Failed to update client {uuid}: {data.get('msg', 'Unknown error')}")
                 
             return success
             
         except Exception as e:
-            logger.error(f"Error updating client: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error updating client: {str(e)}", exc_info=True)
             return False
 
     def add_client(self, inbound_id: int, email: str, uuid: str = None, traffic_gb: int = 0, 
@@ -862,7 +900,7 @@ class PanelAPI:
                 return False
             
         except Exception as e:
-            logger.error(f"Error adding client: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error adding client: {str(e)}", exc_info=True)
             return False
             
     def _get_inbound_info(self, inbound_id: int) -> Dict[str, Any]:
@@ -0,0 +1,44 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+
+class TokenBucketLimiter:
+    """In-memory per-user token bucket.
+
+    Each user may burst up to ``capacity`` requests; tokens refill at
+    ``capacity / window`` per second. State is process-local; buckets that
+    have refilled to capacity are dropped, since a missing bucket starts full.
+    """
+
+    def __init__(self, capacity: int, window: float):
+        self.capacity = float(capacity)
+        self.window = window
+        self.rate = capacity / window
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _sweep(self, now: float):
+        """Drop full buckets; called with _lock held"""
+        self._buckets = {
+            user_id: (tokens, last)
+            for user_id, (tokens, last) in self._buckets.items()
+            if tokens + (now - last) * self.rate < self.capacity
+        }
+        self._last_sweep = now
+
+    def allow(self, user_id: int) -> bool:
+        """Take one token for ``user_id``; False if the bucket is empty"""
+        now = time.monotonic()
+        with self._lock:
+            # Any bucket idle for a full window has refilled
+            if now - self._last_sweep >= self.window:
+                self._sweep(now)
+            tokens, last = self._buckets.get(user_id, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[user_id] = (tokens, now)
+                return False
+            self._buckets[user_id] = (tokens - 1, now)
+            return True
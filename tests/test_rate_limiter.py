@@ -0,0 +1,61 @@
+import pytest
+
+from src.utils import rate_limiter
+from src.utils.rate_limiter import TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', fake)
+    return fake
+
+
+def test_burst_up_to_capacity_then_denied(clock):
+    limiter = TokenBucketLimiter(capacity=5, window=60)
+
+    assert all(limiter.allow(1) for _ in range(5))
+    assert not limiter.allow(1)
+    # Other users have their own bucket
+    assert limiter.allow(2)
+
+
+def test_refills_one_token_per_window_over_capacity(clock):
+    limiter = TokenBucketLimiter(capacity=5, window=60)
+    for _ in range(5):
+        limiter.allow(1)
+    assert not limiter.allow(1)
+
+    clock.now += 60 / 5
+    assert limiter.allow(1)
+    assert not limiter.allow(1)
+
+
+def test_sweep_drops_full_buckets(clock):
+    limiter = TokenBucketLimiter(capacity=5, window=60)
+    limiter.allow(1)
+    for _ in range(5):
+        limiter.allow(2)
+    assert set(limiter._buckets) == {1, 2}
+
+    # User 1 is back to capacity; user 2 is still short
+    clock.now += 60 / 5
+    limiter._sweep(clock.now)
+    assert set(limiter._buckets) == {2}
+
+
+def test_allow_sweeps_once_per_window(clock):
+    limiter = TokenBucketLimiter(capacity=5, window=60)
+    limiter.allow(1)
+
+    clock.now += 60
+    limiter.allow(2)
+    assert set(limiter._buckets) == {2}